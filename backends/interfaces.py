@@ -66,6 +66,9 @@ class IBot(zope.interface.Interface):
     def is_user_admin(user: str) -> bool:
         """Check if a user is an admin for the bot"""
 
+    def is_user_admin_cached(user: str) -> Optional[bool]:
+        """Return the admin status if known without a lookup, else None"""
+
     def reload():
         """(Re)load settings from config"""
 
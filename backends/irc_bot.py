@@ -19,6 +19,7 @@ from collections import namedtuple
 from twisted.words.protocols import irc
 from twisted.internet import defer, reactor
 from twisted.internet import ssl
+from twisted.python.failure import Failure
 from twisted.web.server import Site
 from twisted.web.template import Tag
 from twisted.logger import Logger
@@ -41,6 +42,7 @@ irc.symbolic_to_numeric["RPL_WHOISAUTH"] = "330"
 irc.numeric_to_symbolic["330"] = "RPL_WHOISAUTH"
 
 Alias = namedtuple("Alias", "command arguments")
+DispatchPatterns = namedtuple("DispatchPatterns", "nickname command triggers")
 
 
 @implementer(IBot)
@@ -56,6 +58,8 @@ class IRCBot(irc.IRCClient, object):
                          "reload": "reload_config",
                          "about": "about"
                          }
+    # seconds an admin verdict is trusted before asking the server again
+    AdminCacheTimeout = 30
     log = Logger()
 
     def __init__(self, config):
@@ -64,10 +68,15 @@ class IRCBot(irc.IRCClient, object):
         self.password = self.config["Connection"].get("serverpassword", None)
         self._usercallback = {}
         self._authcallback = {}
+        self._admin_cache = {}
+        self._pending_admin_checks = {}
         self.commands = {}
+        self._help_cache = None
         self.aliases = {}
         self.triggers = {}
+        self._dispatch_patterns = None
         self.userlist = {}
+        self._ignore_patterns = []
         self.load_settings()
 
     def reload(self):
@@ -84,9 +93,14 @@ class IRCBot(irc.IRCClient, object):
         # channel passwords
         self.channel_keys = self.config["Connection"].get("channelkeys", dict())
 
+        self._compile_ignorelist()
+        # the adminlist may have changed
+        self._admin_cache = {}
+
         # clear the commands
         del self.commands
         self.commands = {}
+        self._help_cache = None
 
         # load the commands
         cmds = self.config.get("Commands", {})
@@ -104,6 +118,7 @@ class IRCBot(irc.IRCClient, object):
         # clear the triggers
         del self.triggers
         self.triggers = {}
+        self._dispatch_patterns = None
 
         # load the triggers
         for trigger in self.config.get("Triggers", []):
@@ -124,6 +139,7 @@ class IRCBot(irc.IRCClient, object):
         name = name if name else cmd
         self.commands[name] = getattr(commands, cmd)(self)
         next(self.commands[name])
+        self._help_cache = None
         # add to config
         if add_to_config:
             self.config["Commands"][name] = cmd
@@ -143,6 +159,7 @@ class IRCBot(irc.IRCClient, object):
             return True
 
         self.aliases[name] = Alias(command=cmd, arguments=args.split(" "))
+        self._help_cache = None
         # add to config
         if add_to_config:
             self.config["Aliases"][name] = body
@@ -177,8 +194,25 @@ class IRCBot(irc.IRCClient, object):
         regex = __trigs_inv[name]
         self.triggers[regex] = getattr(triggers, name)(self, config)
         next(self.triggers[regex])
+        self._dispatch_patterns = None
         return True
 
+    def _get_dispatch_patterns(self):
+        """
+        Return the compiled command and trigger patterns - they depend on the
+        nickname, so they are rebuilt when it or the triggers change
+        """
+        if (self._dispatch_patterns is None or
+                self._dispatch_patterns.nickname != self.nickname):
+            command = re.compile(r"^" + self.nickname + r"(:|,)?\s")
+            trigger_patterns = [(re.compile(regex.replace("$NICKNAME",
+                                                          self.nickname)),
+                                 gen) for regex, gen in self.triggers.items()]
+            self._dispatch_patterns = DispatchPatterns(
+                nickname=self.nickname, command=command,
+                triggers=trigger_patterns)
+        return self._dispatch_patterns
+
     def auth(self):
         """Authenticate to the server (NickServ, Q, etc)"""
         service = self.config["Auth"].get("service", None)
@@ -277,8 +311,7 @@ class IRCBot(irc.IRCClient, object):
 
         cmdmode = False
         # Commands
-        pat = re.compile(r"^" + self.nickname + r"(:|,)?\s")
-        if pat.search(msg):
+        if self._get_dispatch_patterns().command.search(msg):
             cmdmode = True
             index = 1
 
@@ -312,13 +345,9 @@ class IRCBot(irc.IRCClient, object):
             else:
                 self.log.debug("No such command: {cmd}", cmd=command)
 
-        # Triggers
-        matches = [(re.search(re.compile(regex.replace("$NICKNAME",
-                                                       self.nickname)), msg),
-                   gen) for regex, gen in self.triggers.items()]
-
-        # filter out empty matches
-        matches = [gen for match, gen in matches if match]
+        # Triggers - fetched after the command, which might have reloaded them
+        matches = [gen for pattern, gen in self._get_dispatch_patterns().triggers
+                   if pattern.search(msg)]
 
         # send message to generator functions
         for gen in matches:
@@ -342,6 +371,7 @@ class IRCBot(irc.IRCClient, object):
         ignorelist.append(user)
         self.config["Connection"]["ignore"] = ignorelist
         self.config.write()
+        self._compile_ignorelist()
 
     def remove_from_ignorelist(self, user):
         if not self.is_user_ignored(user):
@@ -350,18 +380,29 @@ class IRCBot(irc.IRCClient, object):
         ignorelist.remove(user)
         self.config["Connection"]["ignore"] = ignorelist
         self.config.write()
+        self._compile_ignorelist()
 
-    def is_user_ignored(self, user):
-        """Test whether to ignore the user"""
+    def _compile_ignorelist(self):
+        """Precompile the ignore patterns, invalid regexes are kept as plain
+        substrings"""
+        patterns = []
         for iu in self.get_ignorelist():
             try:
-                if re.search(re.compile(iu, re.IGNORECASE), user):
-                    self.log.info("ignoring {user}", user=user)
-                    return True
+                patterns.append((re.compile(iu, re.IGNORECASE), iu))
             except re.error:
-                if iu in user:
+                patterns.append((None, iu))
+        self._ignore_patterns = patterns
+
+    def is_user_ignored(self, user):
+        """Test whether to ignore the user"""
+        for pat, iu in self._ignore_patterns:
+            if pat is not None:
+                if pat.search(user):
                     self.log.info("ignoring {user}", user=user)
                     return True
+            elif iu in user:
+                self.log.info("ignoring {user}", user=user)
+                return True
         return False
 
     def topicUpdated(self, user, channel, newTopic):
@@ -522,6 +563,7 @@ class IRCBot(irc.IRCClient, object):
             del self.user_info.cache[key]
         if key in self.get_auth.cache:
             del self.get_auth.cache[key]
+        self._admin_cache.pop(user.lower(), None)
 
     def irc_RPL_WHOISUSER(self, prefix, params):
         _, nick, user, host, _, realname = params
@@ -562,36 +604,49 @@ class IRCBot(irc.IRCClient, object):
             return
         self._authcallback[user]["userinfo"] = params[2]
 
+    def is_user_admin_cached(self, user):
+        """Return the cached admin verdict for an user or None if unknown"""
+        cached = self._admin_cache.get(user.lower())
+        if cached is not None and cached[1] > reactor.seconds():
+            return cached[0]
+        return None
+
     def is_user_admin(self, user):
         """Check if an user is admin - returns a deferred!"""
         user = user.lower()
-        d = defer.Deferred()
-
-        def _cb_userinfo(userinfo):
-            if not userinfo:
-                d.callback(False)
-            else:
-                if userinfo.host in self.get_adminlist():
-                    d.callback(True)
+        cached = self.is_user_admin_cached(user)
+        if cached is not None:
+            return defer.succeed(cached)
+        # share the answer of a lookup that is already running
+        if user in self._pending_admin_checks:
+            d = defer.Deferred()
+            self._pending_admin_checks[user].append(d)
+            return d
+        self._pending_admin_checks[user] = []
+
+        def _cb_verdict(info):
+            is_admin = bool(info) and info in self.get_adminlist()
+            self._admin_cache[user] = (is_admin,
+                                       reactor.seconds() + self.AdminCacheTimeout)
+            return is_admin
+
+        def _notify_waiting(result):
+            # runs for successes and failures (including errors in
+            # _cb_verdict), so the pending entry is always removed
+            for waiting in self._pending_admin_checks.pop(user, []):
+                if isinstance(result, Failure):
+                    waiting.errback(result)
                 else:
-                    d.callback(False)
-
-        def _cb_auth(authinfo):
-            if not authinfo:
-                d.callback(False)
-            else:
-                if authinfo in self.get_adminlist():
-                    d.callback(True)
-                else:
-                    d.callback(False)
+                    waiting.callback(result)
+            return result
 
         if self.config["Connection"].get("adminbyhost", False):
-            maybe_def = defer.maybeDeferred(self.user_info, user)
-            maybe_def.addCallback(_cb_userinfo)
+            d = defer.maybeDeferred(self.user_info, user)
+            d.addCallback(lambda userinfo: userinfo and userinfo.host)
         else:
-            maybe_def = defer.maybeDeferred(self.get_auth, user)
-            maybe_def.addCallback(_cb_auth)
-
+            d = defer.maybeDeferred(self.get_auth, user)
+        d.addCallback(_cb_verdict)
+        d.addBoth(_notify_waiting)
         return d
 
     def get_user_info(self, user):
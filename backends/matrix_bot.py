@@ -176,6 +176,9 @@ class MatrixBot:
     def get_displayname(self, user: str, channel: str) -> str:
         return self.client.rooms[channel].users[user].display_name
 
+    def is_user_admin_cached(self, user: str) -> Optional[bool]:
+        return user in self.config["Connection"]["admins"]
+
     @maybe_deferred
     def is_user_admin(self, user: str) -> bool:
         return user in self.config["Connection"]["admins"]
@@ -19,6 +19,7 @@ from collections import deque, defaultdict
 from string import Template
 import random
 from enum import Enum
+import functools
 from unidecode import unidecode
 from twisted.logger import Logger
 from twisted.words.protocols import irc
@@ -29,6 +30,14 @@ from backends import Backends
 from util import formatting
 
 
+@functools.lru_cache(maxsize=1024)
+def _unidecode(message):
+    # spam floods repeat the same message, so they only get transliterated once
+    if message.isascii():
+        return message
+    return unidecode(message)
+
+
 class Autokick(abstract.ChannelWatcher):
     logger = Logger()
     Mode = Enum("Mode", "KICK KICK_THEN_BAN BAN_CHANMODE BAN_SERVICE")
@@ -172,8 +181,7 @@ class Autokick(abstract.ChannelWatcher):
         if user == self.bot.nickname.lower() or user in self.user_whitelist:
             return False
         if self.use_unidecode:
-            message = unidecode(message)
-        print(message)
+            message = _unidecode(message)
         temp = re.sub(self.bot.nickname, "BOTNAME", message,
                       flags=re.IGNORECASE)
         if any(pattern.search(temp) for pattern in self.msg_whitelist):
@@ -86,6 +86,7 @@ PollStatus = Enum("PollStatus", "RUNNING CANCELED PASSED TIED FAILED VETOED DECI
 VoteDecision = Enum("VoteDecision", "NONE ABSTAIN YES NO")
 
 PollDelayedCalls = namedtuple("PollDelayedCalls", "end_warning end")
+PendingConfirmation = namedtuple("PendingConfirmation", "deferred timeout")
 VoteCount = namedtuple("VoteCount", "not_voted abstained yes no")
 
 PollListStatusFilterType = typing.Literal["RUNNING", "CANCELED", "PASSED", "TIED",
@@ -387,12 +388,38 @@ class CommandOptions(OptionsWithoutHandlers):
     ]
 
 
+_SUBCOMMAND_TABLES = {}
+
+# constant headings of the vhelp output, shared by all messages
+_VHELP_COMMANDS_HEADING = formatting.colored("Available commands", ColorCodes.blue)
+_VHELP_FLAGS_HEADING = formatting.colored("Flags", ColorCodes.yellow)
+_VHELP_PARAMS_HEADING = formatting.colored("Optional parameters", ColorCodes.yellow)
+_VHELP_POS_PARAMS_HEADING = formatting.colored("Positional parameters", ColorCodes.lime)
+
+
+def get_subOption(option_class, subCommand):
+    """Look up a subcommand (long or short name) of an options class"""
+    table = _SUBCOMMAND_TABLES.get(option_class)
+    if table is None:
+        table = {}
+        for long, short, option, desc in getattr(option_class, "subCommands", []):
+            table[long] = (option, desc)
+            if short:
+                table[short] = (option, desc)
+        _SUBCOMMAND_TABLES[option_class] = table
+    try:
+        return table[subCommand]
+    except KeyError:
+        raise KeyError("No such subcommand")
+
+
 class Vote(abstract.ChannelWatcher):
     logger = Logger()
     supported_backends = [Backends.IRC, Backends.MATRIX]
 
     PollEndWarningTime = timedelta(days=2)
     PollDefaultDuration = timedelta(days=15)
+    VoteInsertDelay = 0.1 # seconds to collect new votes before writing them
     expireTimeRegex = re.compile(r"(extend|reduce)\s+(?:(\d+)\s*d(?:ays?)?)?\s*(?:(\d+)\s*h(?:ours?)?)?$")
     description_length = 150
     PrivilegeOrder = {"ADMIN": 0, "USER": 10, "REVOKED": 20} # Lower means shown earlier
@@ -413,9 +440,12 @@ class Vote(abstract.ChannelWatcher):
         USER = ColorCodes.lime
         REVOKED = ColorCodes.darkred
 
+    DecisionColors = {VoteDecision.YES: Colors.yes, VoteDecision.NO: Colors.no}
+
     def __init__(self, bot, channel, config):
         super(Vote, self).__init__(bot, channel, config)
         self.prefix = config.get("prefix", "!")
+        self._prefix_len = len(self.prefix)
         self._poll_url = config.get("poll_url", None)
         self._http_secret = config.get("http_secret", None)
         self.notification_channel = config.get("notification_channel", None)
@@ -434,8 +464,25 @@ class Vote(abstract.ChannelWatcher):
         self._pending_confirmations = {}
         self._num_active_users = 0
         self._poll_delayed_calls = {}
+        self._pending_vote_inserts = {}
+        self._vote_insert_waiters = []
+        self._vote_insert_call = None
+        self._command_dispatch = self._build_command_dispatch()
         self._setup()
 
+    def _build_command_dispatch(self):
+        """Map (command, subcommand) to the corresponding cmd_* method"""
+        dispatch = {}
+        for command, _, option_class, _ in CommandOptions.subCommands:
+            subCommands = getattr(option_class, "subCommands", [])
+            if not subCommands:
+                dispatch[(command, None)] = getattr(self, "cmd_" + command)
+                continue
+            for subCommand, _, _, _ in subCommands:
+                dispatch[(command, subCommand)] = getattr(
+                    self, "cmd_" + command + "_" + subCommand)
+        return dispatch
+
     def load_message_templates(self, message_config: dict) -> None:
         crumbs = {}
         crumbs["poll_id_stub"] = message_config.get("poll_id_stub", 'Poll #<font color="darkorange"><t:slot name="poll_id"/></font>')
@@ -537,19 +584,34 @@ class Vote(abstract.ChannelWatcher):
                        {"poll_id": poll_id, "value": value})
 
     @staticmethod
-    def insert_vote(cursor, poll_id, user, decision, comment):
-        cursor.execute('INSERT INTO Votes (poll_id, user, vote, comment) '
-                       'VALUES (:id, :user, :decision, :comment);',
-                       {"id": poll_id, "user": user, "decision": decision.name,
-                        "comment": comment})
+    def insert_votes(cursor, rows):
+        """
+        Insert new votes and return the vote count of the poll right after
+        each of them, in the order of rows
+        """
+        counts = []
+        for row in rows:
+            cursor.execute('INSERT INTO Votes (poll_id, user, vote, comment) '
+                           'VALUES (:id, :user, :decision, :comment);', row)
+            counts.append(Vote.select_vote_count(cursor, row["id"]))
+        return counts
 
     @staticmethod
     def update_vote_decision(cursor, poll_id, user, decision, comment):
+        """Change a vote and return the vote count of the poll"""
         cursor.execute('UPDATE Votes '
                        'SET vote=:decision, comment=:comment '
                        'WHERE poll_id=:id AND user=:user;',
                        {"id": poll_id, "user": user, "decision": decision.name,
                         "comment": comment})
+        return Vote.select_vote_count(cursor, poll_id)
+
+    @staticmethod
+    def select_vote_count(cursor, poll_id):
+        cursor.execute('SELECT vote, COUNT(vote) FROM Votes '
+                       'WHERE poll_id=:poll_id GROUP BY vote;',
+                       {"poll_id": poll_id})
+        return cursor.fetchall()
 
     @staticmethod
     def add_not_voted(cursor, poll_id):
@@ -616,11 +678,7 @@ class Vote(abstract.ChannelWatcher):
 
     @staticmethod
     def vote_decision_color(decision: VoteDecision) -> ColorCodes:
-        if decision == VoteDecision.YES:
-            return Vote.Colors.yes
-        if decision == VoteDecision.NO:
-            return Vote.Colors.no
-        return ColorCodes.lightgray
+        return Vote.DecisionColors.get(decision, ColorCodes.lightgray)
 
     @defer.inlineCallbacks
     def get_user_privilege(self, name):
@@ -690,9 +748,11 @@ class Vote(abstract.ChannelWatcher):
 
     @defer.inlineCallbacks
     def count_votes(self, poll_id, is_running):
-        res = yield self.dbpool.runQuery('SELECT vote, COUNT(vote) FROM Votes '
-                                         'WHERE poll_id=:poll_id GROUP BY vote;',
-                                         {"poll_id": poll_id})
+        res = yield self.dbpool.runInteraction(Vote.select_vote_count, poll_id)
+        return self.build_vote_count(res, is_running)
+
+    def build_vote_count(self, res, is_running):
+        """Create a VoteCount from the rows of select_vote_count"""
         if not res:
             return VoteCount(abstained=0, yes=0, no=0, not_voted=self._num_active_users)
         c = defaultdict(int)
@@ -704,6 +764,71 @@ class Vote(abstract.ChannelWatcher):
         return VoteCount(abstained=c[VoteDecision.ABSTAIN], yes=c[VoteDecision.YES],
                          no=c[VoteDecision.NO], not_voted=c[VoteDecision.NONE])
 
+    def queue_vote_insert(self, poll_id, user, decision, comment):
+        """
+        Queue a new vote for insertion - returns a deferred that fires with
+        the rows of select_vote_count for the poll, queried right after the
+        vote was inserted. Votes arriving within VoteInsertDelay are written in one
+        transaction. If the user already has a vote queued for the poll, the
+        new one is dropped and the deferred fires with None
+        """
+        if (poll_id, user) in self._pending_vote_inserts:
+            return defer.succeed(None)
+        d = defer.Deferred()
+        row = {"id": poll_id, "user": user, "decision": decision.name,
+               "comment": comment}
+        self._pending_vote_inserts[(poll_id, user)] = (row, d)
+        if self._vote_insert_call is None:
+            self._vote_insert_call = reactor.callLater(Vote.VoteInsertDelay,
+                                                       self._flush_vote_inserts)
+        return d
+
+    def wait_vote_insert(self, poll_id, user):
+        """
+        Returns a deferred that fires once a queued vote of the user for
+        the poll has been written
+        """
+        if (poll_id, user) not in self._pending_vote_inserts:
+            return defer.succeed(None)
+        d = defer.Deferred()
+        self._vote_insert_waiters.append(d)
+        return d
+
+    @defer.inlineCallbacks
+    def _flush_vote_inserts(self):
+        self._vote_insert_call = None
+        pending = list(self._pending_vote_inserts.values())
+        self._pending_vote_inserts = {}
+        waiters = self._vote_insert_waiters
+        self._vote_insert_waiters = []
+        try:
+            yield self._insert_votes(pending)
+        finally:
+            for d in waiters:
+                d.callback(None)
+
+    @defer.inlineCallbacks
+    def _insert_votes(self, pending):
+        try:
+            counts = yield self.dbpool.runInteraction(Vote.insert_votes,
+                                                      [row for row, _ in pending])
+        except Exception as e:
+            if len(pending) == 1:
+                pending[0][1].errback(e)
+                return
+            # a single bad row aborts the whole batch, retry them one by one
+            for row, d in pending:
+                try:
+                    counts = yield self.dbpool.runInteraction(Vote.insert_votes,
+                                                              [row])
+                except Exception as e:
+                    d.errback(e)
+                else:
+                    d.callback(counts[0])
+            return
+        for (_, d), count in zip(pending, counts):
+            d.callback(count)
+
     @defer.inlineCallbacks
     def notify_missing_voters(self, poll_id):
         res = yield self.dbpool.runQuery('SELECT id FROM Users WHERE privilege!="REVOKED";')
@@ -1291,6 +1416,8 @@ class Vote(abstract.ChannelWatcher):
                             pollstatus.name))
             return
         try:
+            # a vote of this user might still wait for insertion
+            yield self.wait_vote_insert(poll_id, voterid)
             query = yield self.dbpool.runQuery(
                 'SELECT vote, comment FROM Votes '
                 'WHERE poll_id=:poll_id AND user=:voterid;',
@@ -1312,9 +1439,9 @@ class Vote(abstract.ChannelWatcher):
                                                                 confirmation_msg)
                 if not confirmed:
                     return
-                yield self.dbpool.runInteraction(Vote.update_vote_decision,
-                                                 poll_id, voterid, decision,
-                                                 comment)
+                res = yield self.dbpool.runInteraction(Vote.update_vote_decision,
+                                                       poll_id, voterid, decision,
+                                                       comment)
                 msg = self.vote_changed_stub.clone()
                 msg.fillSlots(poll_id=str(poll_id), user=voter_displayname,
                               previous_decision=previous_decision.name,
@@ -1323,8 +1450,14 @@ class Vote(abstract.ChannelWatcher):
                               decision_color=Vote.vote_decision_color(decision),
                               comment=comment or "No Comment")
             else:
-                yield self.dbpool.runInteraction(Vote.insert_vote, poll_id,
-                                                 voterid, decision, comment)
+                res = yield self.queue_vote_insert(poll_id, voterid, decision,
+                                                   comment)
+                if res is None:
+                    # another vote of this user is queued, treat this one
+                    # as a change of it once it has been written
+                    yield self.wait_vote_insert(poll_id, voterid)
+                    self.cmd_vote(voter, poll_id, decision, comment, **kwargs)
+                    return
                 msg = self.new_vote_stub.clone()
                 msg.fillSlots(poll_id=str(poll_id), user=voter_displayname,
                               decision=decision.name,
@@ -1334,7 +1467,7 @@ class Vote(abstract.ChannelWatcher):
             self.bot.notice(voter, "An error occured. Please contact the admin.")
             Vote.logger.warn("Encountered error during vote: {}".format(e))
             return
-        vote_count = yield self.count_votes(poll_id, True)
+        vote_count = self.build_vote_count(res, True)
         # end poll early on 2/3 majority
         early_consensus = 3 * max(vote_count.yes, vote_count.no) >= 2 * self._num_active_users
         if not early_consensus:
@@ -1346,8 +1479,11 @@ class Vote(abstract.ChannelWatcher):
             msg.children.append(current_result)
         self.bot.msg(self.channel, msg)
         if early_consensus:
-            self._poll_delayed_call_cancel(poll_id)
-            self.end_poll(poll_id)
+            # several votes of one batch can reach the majority, end only once
+            delayed_calls = self._poll_delayed_calls.get(poll_id)
+            if delayed_calls and delayed_calls.end.active():
+                self._poll_delayed_call_cancel(poll_id)
+                self.end_poll(poll_id)
 
     @maybe_deferred
     def require_confirmation(self, user, userid, message):
@@ -1358,16 +1494,19 @@ class Vote(abstract.ChannelWatcher):
         self.bot.notice(self.channel, message)
         d = defer.Deferred()
 
-        def onTimeout(*args):
+        def onTimeout():
             self.bot.notice(user, "Confirmation timed out")
             d.callback(False)
-        d.addTimeout(60, reactor, onTimeoutCancel=onTimeout)
+        timeout_call = reactor.callLater(60, onTimeout)
         d.addBoth(self._confirmation_finalize, userid)
-        self._pending_confirmations[userid] = d
+        self._pending_confirmations[userid] = PendingConfirmation(
+            deferred=d, timeout=timeout_call)
         return d
 
     def _confirmation_finalize(self, result, userid):
-        self._pending_confirmations.pop(userid)
+        pending = self._pending_confirmations.pop(userid)
+        if pending.timeout.active():
+            pending.timeout.cancel()
         return result
 
     def cmd_yes(self, issuer):
@@ -1382,15 +1521,9 @@ class Vote(abstract.ChannelWatcher):
         if userid not in self._pending_confirmations:
             self.bot.notice(issuer, "Nothing to confirm")
             return
-        self._pending_confirmations[userid].callback(decision)
+        self._pending_confirmations[userid].deferred.callback(decision)
 
     def cmd_vhelp(self, user, topic):
-        def get_subOption(option_class, subCommand):
-            for long, short, option, desc in option_class.subCommands:
-                if subCommand == long or subCommand == short:
-                    return option, desc
-            raise KeyError("No such subcommand")
-
         option_class = CommandOptions
         desc = "Vote module"
         if topic:
@@ -1405,8 +1538,7 @@ class Vote(abstract.ChannelWatcher):
 
         sig = option_class.chat_help()
         if sig.subCommands:
-            msg = Tag("")(formatting.colored("Available commands",
-                                             ColorCodes.blue), ": ")
+            msg = Tag("")(_VHELP_COMMANDS_HEADING, ": ")
             for i, command in enumerate(sig.subCommands):
                 if i > 0:
                     msg.children.append(" | ")
@@ -1415,19 +1547,17 @@ class Vote(abstract.ChannelWatcher):
             return
         msg = Tag("")(desc)
         if sig.flags:
-            msg.children.append(formatting.colored("Flags", ColorCodes.yellow))
+            msg.children.append(_VHELP_FLAGS_HEADING)
             msg.children.append(": " + "; ".join(sig.flags))
         if sig.params:
             if len(msg.children):
                 msg.children.append(tags.br)
-            msg.children.append(formatting.colored("Optional parameters",
-                                                   ColorCodes.yellow))
+            msg.children.append(_VHELP_PARAMS_HEADING)
             msg.children.append(": " + "; ".join(sig.params))
         if sig.pos_params:
             if len(msg.children):
                 msg.children.append(tags.br)
-            msg.children.append(formatting.colored("Positional parameters",
-                                                   ColorCodes.lime))
+            msg.children.append(_VHELP_POS_PARAMS_HEADING)
             msg.children.append(": " + "; ".join(sig.pos_params))
         self.bot.notice(user, msg)
 
@@ -1446,7 +1576,7 @@ class Vote(abstract.ChannelWatcher):
         if not result:
             return
         num_running_polls = len(result)
-        poll_id_list = set(itertools.chain(*result))
+        poll_id_list = {row[0] for row in result}
         user_id = yield self.bot.get_auth(user)
         result = yield self.dbpool.runQuery(
             'SELECT poll_id FROM Votes '
@@ -1459,7 +1589,7 @@ class Vote(abstract.ChannelWatcher):
             num_already_voted = len(result)
         remaining = num_running_polls - num_already_voted
         if remaining:
-            not_voted = sorted(set(poll_id_list) - set(itertools.chain(*result)))
+            not_voted = sorted(poll_id_list - {row[0] for row in result})
             self.bot.notice(user, "There are {} open polls without your "
                             "vote ({})".format(remaining, ", ".join(
                                 map(str, not_voted))))
@@ -1484,7 +1614,7 @@ class Vote(abstract.ChannelWatcher):
         message = formatting.to_plaintext(message)
         if not message.startswith(self.prefix):
             return
-        tokens = message.lstrip(self.prefix).split()
+        tokens = message[self._prefix_len:].split()
         options = CommandOptions()
         try:
             options.parseOptions(tokens)
@@ -1492,17 +1622,22 @@ class Vote(abstract.ChannelWatcher):
             self.bot.notice(user, str(e))
             return
         command = options.subCommand
-        if options.subOptions.subCommand:
-            commandstr = "cmd_" + command + "_" + options.subOptions.subCommand
+        subCommand = options.subOptions.subCommand
+        if subCommand:
             subOptions = options.subOptions.subOptions
         else:
-            commandstr = "cmd_" + str(command)
             subOptions = options.subOptions
         try:
-            getattr(self, commandstr)(user, **subOptions)
+            self._command_dispatch[(command, subCommand)](user, **subOptions)
         except Exception as e:
             Vote.logger.info("Error while executing vote command: {error!r}",
                              error=e)
 
+    def stop(self):
+        # write votes that are still queued
+        if self._vote_insert_call is not None:
+            self._vote_insert_call.cancel()
+            self._flush_vote_inserts()
+
     def connectionLost(self, reason):
-        pass
+        self.stop()
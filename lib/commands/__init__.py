@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from collections import namedtuple
 import sys
 from twisted.web.template import Tag, tags
 
@@ -26,37 +27,74 @@ from lib.commands.education import *
 from lib.commands.fun import *
 
 
-def bot_help(bot):
-    """Guess what this function does"""
+HelpCache = namedtuple("HelpCache", "docs overview")
+
+# help entries are joined into lines of at most this many visible chars,
+# leaving room for the formatting codes within the 510 bytes of an IRC line
+_HELP_LINE_LENGTH = 300
+_HELP_SEPARATOR = " | "
+
+
+def _get_help_cache(bot):
+    """
+    Return the command docstrings and the rendered command/alias overview -
+    the bot invalidates this whenever commands or aliases are (re)loaded
+    """
+    cache = getattr(bot, "_help_cache", None)
+    if cache is not None:
+        return cache
     thismodule = sys.modules[__name__]
+    docs = {}
+    for name, gen in bot.commands.items():
+        func = getattr(thismodule, gen.__name__, None)
+        if func is not None:
+            docs[name] = func.__doc__ or "No help available"
+    aliases = []
+    for name, alias in bot.aliases.items():
+        aliases.append("{name} ({body})".format(
+            name=name, body=" ".join([alias.command] + alias.arguments)))
+    overview = [formatting.colored("Commands: ", ColorCodes.darkorange),
+                ", ".join(bot.commands)]
+    if aliases:
+        overview += [tags.br, formatting.colored("Aliases: ",
+                                                 ColorCodes.darkgreen),
+                     ", ".join(aliases)]
+    cache = HelpCache(docs=docs, overview=Tag("")(*overview))
+    bot._help_cache = cache
+    return cache
+
 
+def bot_help(bot):
+    """Guess what this function does"""
     while True:
         args, sender, channel = yield
-        commands = {name: gen.__name__ for name, gen in bot.commands.items()}
-        aliases = []
-        for name, alias in bot.aliases.items():
-            aliases.append("{name} ({body})".format(
-                name=name, body=" ".join([alias.command] + alias.arguments)))
+        cache = _get_help_cache(bot)
+        if not args:
+            bot.msg(channel, cache.overview)
+            continue
+        docs = cache.docs
         doc = []
-        if args:
-            for arg in args:
-                if arg:
-                    if doc:
-                        doc.append(tags.br)
-                    try:
-                        _gen = getattr(thismodule, commands[arg])
-                        doc += [formatting.colored(arg + ": ", ColorCodes.red),
-                                formatting.colored(_gen.__doc__ or "No help available",
-                                                   ColorCodes.darkblue)]
-                    except (AttributeError, KeyError):
-                        doc += [formatting.colored("No command called ",
-                                                   ColorCodes.red),
-                                formatting.colored(arg, ColorCodes.darkgreen)]
-        else:
-            doc = [formatting.colored("Commands: ", ColorCodes.darkorange),
-                   ", ".join(commands)]
-            if aliases:
-                doc += [tags.br, formatting.colored("Aliases: ",
-                                                    ColorCodes.darkgreen),
-                        ", ".join(aliases)]
+        line_length = 0
+        for arg in args:
+            if not arg:
+                continue
+            if arg in docs:
+                entry = [formatting.colored(arg + ": ", ColorCodes.red),
+                         formatting.colored(docs[arg], ColorCodes.darkblue)]
+                entry_length = len(arg) + 2 + len(docs[arg])
+            else:
+                entry = [formatting.colored("No command called ",
+                                            ColorCodes.red),
+                         formatting.colored(arg, ColorCodes.darkgreen)]
+                entry_length = 18 + len(arg)
+            if doc:
+                if (line_length + len(_HELP_SEPARATOR) + entry_length >
+                        _HELP_LINE_LENGTH):
+                    doc.append(tags.br)
+                    line_length = 0
+                else:
+                    doc.append(_HELP_SEPARATOR)
+                    line_length += len(_HELP_SEPARATOR)
+            doc += entry
+            line_length += entry_length
         bot.msg(channel, Tag("")(*doc))
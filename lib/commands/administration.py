@@ -14,109 +14,157 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from twisted.internet import defer as _defer
+from twisted.logger import Logger
+
 from util.formatting import ColorCodes
 from util import formatting
 
 
+log = Logger()
+
+
+_IGNORE_ADD = frozenset(("+", "add"))
+_IGNORE_REMOVE = frozenset(("-", "remove"))
+_IGNORE_LIST = frozenset(("ls", "list"))
+
+
+def _when_admin_known(bot, sender, callback, *args):
+    """
+    Call callback(is_admin, *args) - right away if the bot already knows
+    whether sender is an admin, otherwise once the lookup finished
+    """
+    is_admin = bot.is_user_admin_cached(sender)
+    if is_admin is None:
+        d = bot.is_user_admin(sender).addCallback(callback, *args)
+    else:
+        # keep errors out of the command generator, as a Deferred would
+        d = _defer.maybeDeferred(callback, is_admin, *args)
+    d.addErrback(_admin_command_failed, callback)
+
+
+def _admin_command_failed(failure, callback):
+    log.failure("Admin command {command} failed", failure,
+                command=callback.__name__.lstrip("_"))
+
+
+def _shutdown(is_admin, bot, channel, args):
+    if is_admin:
+        bot.quit(" ".join(args))
+    else:
+        bot.msg(channel, "I won't listen to you!")
+
+
 def shutdown(bot):
     """Shut down the bot (admin function)"""
-    def _shutdown(is_admin, channel, args):
-        if is_admin:
-            bot.quit(" ".join(args))
-        else:
-            bot.msg(channel, "I won't listen to you!")
-
     while True:
         args, sender, channel = yield
-        bot.is_user_admin(sender).addCallback(_shutdown, channel, args)
+        _when_admin_known(bot, sender, _shutdown, bot, channel, args)
+
+
+def _do_ignore(is_admin, bot, sender, args):
+    if is_admin:
+        task = args[0].lower() if args else ""
+        if len(args) == 1 and task in _IGNORE_LIST:
+            ignorelist = bot.get_ignorelist()
+            if ignorelist:
+                bot.notice(sender, ", ".join(ignorelist))
+            else:
+                bot.notice(sender, "Ignorelist is empty")
+        elif len(args) < 2:
+            bot.notice(sender, "Too few arguments")
+        else:
+            nicks = args[1:]
+
+            if task in _IGNORE_ADD:
+                added = []
+                too_short = []
+                for nick in nicks:
+                    # don't add to short nicks
+                    # may ignore everything otherwise(regex)
+                    if len(nick) > 3:
+                        bot.add_to_ignorelist(nick)
+                        added.append(nick)
+                    else:
+                        too_short.append(nick)
+                if added:
+                    bot.notice(sender, "Added {} to the ignore "
+                               "list".format(", ".join(added)))
+                if too_short:
+                    bot.notice(sender, "Pattern {} too short, must "
+                               "have at least 3 chars".format(
+                                   ", ".join(too_short)))
+            elif task in _IGNORE_REMOVE:
+                removed = []
+                missing = []
+                for nick in nicks:
+                    if bot.is_user_ignored(nick):
+                        bot.remove_from_ignorelist(nick)
+                        removed.append(nick)
+                    else:
+                        missing.append(nick)
+                if removed:
+                    bot.notice(sender, "Removed {} from the ignore "
+                               "list".format(", ".join(removed)))
+                if missing:
+                    bot.notice(sender, "{} not found in the ignore "
+                               "list".format(", ".join(missing)))
+            else:
+                bot.notice(sender,
+                           formatting.colored("Invalid call - check the"
+                                              " help", ColorCodes.red))
 
 
 def ignore(bot):
     """Modify the ignore list - use '+' or 'add' to extend, '-' or 'remove' \
 to remove from the list, 'ls' or 'list' to show the list"""
-    def _do_ignore(is_admin, sender, args):
-        if is_admin:
-            if len(args) == 1 and args[0].lower() in ("ls", "list"):
-                ignorelist = bot.get_ignorelist()
-                if ignorelist:
-                    bot.notice(sender, ", ".join(ignorelist))
-                else:
-                    bot.notice(sender, "Ignorelist is empty")
-            elif len(args) < 2:
-                bot.notice(sender, "Too few arguments")
-            else:
-                task = args[0]
-                nicks = args[1:]
-
-                if task.lower() in ("+", "add"):
-                    for nick in nicks:
-                        # don't add to short nicks
-                        # may ignore everything otherwise(regex)
-                        if len(nick) > 3:
-                            bot.add_to_ignorelist(nick)
-                            bot.notice(sender, "Added {} to the ignore "
-                                       "list".format(nick))
-                        else:
-                            bot.notice(sender, "Pattern {} too short, must "
-                                       "have at least 3 chars".format(nick))
-                elif task.lower() in ("-", "remove"):
-                    for nick in nicks:
-                        if bot.is_user_ignored(nick):
-                            bot.remove_from_ignorelist(nick)
-                            bot.notice(sender, "Removed {} from the ignore "
-                                       "ignore list".format(nick))
-                        else:
-                            bot.notice(sender, "{} was not found in the "
-                                       "ignore list".format(nick))
-                else:
-                    bot.notice(sender,
-                               formatting.colored("Invalid call - check the"
-                                                  " help", ColorCodes.red))
-
     while True:
         args, sender, channel = yield
-        bot.is_user_admin(sender).addCallback(_do_ignore, sender, args)
+        _when_admin_known(bot, sender, _do_ignore, bot, sender, args)
+
+
+def _join(is_admin, bot, channels):
+    if is_admin:
+        for channel in channels:
+            if "=" in channel:
+                channel, key = channel.split("=", 1)
+                # TODO: should the key be saved?
+                bot.join(channel, key)
+            else:
+                bot.join(channel)
 
 
 def join(bot):
     """Join a channel ('join #channel=key' for password protected channels)"""
-    def _join(is_admin, channels):
-        if is_admin:
-            for channel in channels:
-                if "=" in channel:
-                    channel, key = channel.split("=", 1)
-                    # TODO: should the key be saved?
-                    bot.join(channel, key)
-                else:
-                    bot.join(channel)
-
     while True:
         args, sender, channel = yield
-        bot.is_user_admin(sender).addCallback(_join, args)
+        _when_admin_known(bot, sender, _join, bot, args)
+
+
+def _part(is_admin, bot, channels):
+    if is_admin:
+        for c in channels:
+            bot.leave(c)
 
 
 def part(bot):
     """Part channel(s)"""
-    def _part(is_admin, channels):
-        if is_admin:
-            for c in channels:
-                bot.leave(c)
-
     while True:
         args, sender, channel = yield
-        bot.is_user_admin(sender).addCallback(_part, args)
+        _when_admin_known(bot, sender, _part, bot, args)
+
+
+def _change_nick(is_admin, bot, newnick):
+    if is_admin:
+        bot.setNick(newnick)
 
 
 def change_nick(bot):
     """Change the nick"""
-    def _change_nick(is_admin, newnick):
-        if is_admin:
-            bot.setNick(newnick)
-
     while True:
         args, sender, channel = yield
         if args:
-            bot.is_user_admin(sender).addCallback(_change_nick, args[0])
+            _when_admin_known(bot, sender, _change_nick, bot, args[0])
 
 
 def about(bot):
@@ -128,47 +176,54 @@ def about(bot):
         bot.msg(channel, info)
 
 
+def _reload(is_admin, bot):
+    if is_admin:
+        bot.reload()
+
+
 def reload_config(bot):
     """Reload the config"""
-    def _reload(is_admin):
-        if is_admin:
-            bot.reload()
-
     while True:
         args, sender, channel = yield
-        bot.is_user_admin(sender).addCallback(_reload)
+        _when_admin_known(bot, sender, _reload, bot)
+
+
+def _do_kick(is_user_admin: bool, bot, sender: str, args: list):
+    if not is_user_admin:
+        bot.notice(sender, formatting.colored("You're not my boss",
+                                              ColorCodes.red))
+        return
+    if len(args) != 2:
+        bot.notice(sender, formatting.colored("Invalid call - wrong number"
+                                              " of arguments", ColorCodes.red))
+        return
+    channel, user = args
+    bot.kick(channel, user)
+
 
 def kick(bot):
     """Kick a user from a channel (kick <#channel> <user>)"""
-    def _do_kick(is_user_admin: bool, sender: str, args: list):
-        if not is_user_admin:
-            bot.notice(sender, formatting.colored("You're not my boss",
-                                                  ColorCodes.red))
-            return
-        if len(args) != 2:
-            bot.notice(sender, formatting.colored("Invalid call - wrong number"
-                                                  " of arguments", ColorCodes.red))
-            return
-        channel, user = args
-        bot.kick(channel, user)
     while True:
         args, sender, channel = yield
-        bot.is_user_admin(sender).addCallback(_do_kick, sender, args)
+        _when_admin_known(bot, sender, _do_kick, bot, sender, args)
+
+
+def _do_ban(is_user_admin: bool, bot, sender: str, args: list):
+    if not is_user_admin:
+        bot.notice(sender, formatting.colored("You're not my boss",
+                                              ColorCodes.red))
+        return
+    if len(args) != 2:
+        bot.notice(sender, formatting.colored("Invalid call - wrong number"
+                                              " of arguments", ColorCodes.red))
+        return
+    channel, user = args
+    bot.ban(channel, user)
+    bot.kick(channel, user)
+
 
 def ban(bot):
     """ban a user from a channel (ban <#channel> <user>)"""
-    def _do_ban(is_user_admin: bool, sender: str, args: list):
-        if not is_user_admin:
-            bot.notice(sender, formatting.colored("You're not my boss",
-                                                  ColorCodes.red))
-            return
-        if len(args) != 2:
-            bot.notice(sender, formatting.colored("Invalid call - wrong number"
-                                                  " of arguments", ColorCodes.red))
-            return
-        channel, user = args
-        bot.ban(channel, user)
-        bot.kick(channel, user)
     while True:
         args, sender, channel = yield
-        bot.is_user_admin(sender).addCallback(_do_ban, sender, args)
+        _when_admin_known(bot, sender, _do_ban, bot, sender, args)
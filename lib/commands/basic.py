@@ -27,18 +27,25 @@ def tell(bot):
         args, sender, channel = yield
         if len(args):
             targetnick = args[0]
-            body = " ".join(args[1:])
-            bot.msg(targetnick, "<" + sender + "> " + body, length=510)
+            body = args[1] if len(args) == 2 else " ".join(args[1:])
+            bot.msg(targetnick, f"<{sender}> {body}", length=510)
 
 
 def say(bot):
     """Make the bot say something"""
+    # only rebuilt when the nick changes
+    marker_nick = None
+    marker = None
     while True:
         args, sender, channel = yield
         message = " ".join(args)
-        if message.lower() == "something":
+        if bot.nickname != marker_nick:
+            marker_nick = bot.nickname
+            marker = "{}: say".format(marker_nick)
+        # only lower case messages that could be "something" at all
+        if len(message) == 9 and message.lower() == "something":
             message = "To be or not to be - that's the question."
-        elif ("{}: say".format(bot.nickname)) in message:
+        elif marker in message:
             message = "Don't chain this command with another bot!"
         if message:
             bot.msg(channel, message, length=510)
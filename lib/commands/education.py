@@ -20,6 +20,20 @@ from util.formatting import ColorCodes
 from util import formatting
 
 
+_COIN_SIDES = ("Heads", "Tails")
+
+
+def _rand_range(args):
+    return str(random.randint(int(args[1]), int(args[2])))
+
+
+def _rand_frange(args):
+    return str(random.uniform(float(args[1]), float(args[2])))
+
+
+_RAND_OPERATIONS = {"range": _rand_range, "frange": _rand_frange}
+
+
 def rand(bot):
     """Randomizer, opt args: 'range int1 int2', 'frange float1 float2' or \
 list of choices"""
@@ -27,13 +41,11 @@ list of choices"""
         args, sender, channel = yield
         try:
             if not args:
-                result = random.choice(["Heads", "Tails"])
-            elif args[0].lower() == "range":
-                result = str(random.randint(int(args[1]), int(args[2])))
-            elif args[0].lower() == "frange":
-                result = str(random.uniform(float(args[1]), float(args[2])))
+                result = random.choice(_COIN_SIDES)
             else:
-                result = random.choice(args)
+                # anything else is a list of choices
+                operation = _RAND_OPERATIONS.get(args[0].lower(), random.choice)
+                result = operation(args)
         except (IndexError, ValueError):
             result = formatting.colored("Invalid call - check the help",
                                         ColorCodes.red)
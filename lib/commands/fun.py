@@ -14,16 +14,17 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import functools as _functools
+import mmap as _mmap
 import random
 import os
 import sys
-from twisted.internet import defer
 from twisted.logger import Logger
-from treq import get
-from bidict import bidict
+from treq import json_content as _json_content
 import argparse
 
 from util import filesystem as fs
+from util.internet import get_http_client as _get_http_client
 from util.formatting import ColorCodes
 from util import formatting
 
@@ -31,19 +32,37 @@ from util import formatting
 log = Logger()
 
 
-morse_dict = bidict({'A': '.-', 'B': '-...', 'C': '-.-.',
-                     'D': '-..', 'E': '.', 'F': '..-.',
-                     'G': '--.', 'H': '....', 'I': '..',
-                     'J': '.---', 'K': '-.-', 'L': '.-..',
-                     'M': '--', 'N': '-.', 'O': '---',
-                     'P': '.--.', 'Q': '--.-', 'R': '.-.',
-                     'S': '...', 'T': '-', 'U': '..-',
-                     'V': '...-', 'W': '.--', 'X': '-..-',
-                     'Y': '-.--', 'Z': '--..',
-                     '0': '-----', '1': '.----', '2': '..---',
-                     '3': '...--', '4': '....-', '5': '.....',
-                     '6': '-....', '7': '--...', '8': '---..',
-                     '9': '----.', ' ': ''})
+morse_dict = {'A': '.-', 'B': '-...', 'C': '-.-.',
+              'D': '-..', 'E': '.', 'F': '..-.',
+              'G': '--.', 'H': '....', 'I': '..',
+              'J': '.---', 'K': '-.-', 'L': '.-..',
+              'M': '--', 'N': '-.', 'O': '---',
+              'P': '.--.', 'Q': '--.-', 'R': '.-.',
+              'S': '...', 'T': '-', 'U': '..-',
+              'V': '...-', 'W': '.--', 'X': '-..-',
+              'Y': '-.--', 'Z': '--..',
+              '0': '-----', '1': '.----', '2': '..---',
+              '3': '...--', '4': '....-', '5': '.....',
+              '6': '-....', '7': '--...', '8': '---..',
+              '9': '----.', ' ': ''}
+# accept lower case letters directly instead of calling upper() per char
+_MORSE_ENCODE = {**morse_dict, **{k.lower(): v for k, v in morse_dict.items()}}
+
+
+class _MorseTable(dict):
+    """str.translate table that keeps unknown characters"""
+    def __missing__(self, key):
+        return chr(key) + " "
+
+
+_MORSE_TABLE = _MorseTable((ord(k), v + " ") for k, v in _MORSE_ENCODE.items())
+_MORSE_DECODE = {v: k for k, v in morse_dict.items()}
+
+_JOKE_URL = "https://api.chucknorris.io/jokes/random"
+
+_ROT13 = str.maketrans(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz",
+    "NOPQRSTUVWXYZABCDEFGHIJKLMnopqrstuvwxyzabcdefghijklm")
 
 
 def morse(bot):
@@ -51,10 +70,7 @@ def morse(bot):
     while True:
         args, sender, channel = yield
         message = " ".join(args)
-        morsecode = []
-        for char in message:
-            morsecode.append(morse_dict.get(char.upper(), char))
-        morsecode = " ".join(morsecode)
+        morsecode = message.translate(_MORSE_TABLE).rstrip(" ")
         bot.msg(channel, morsecode, length=510)
 
 
@@ -62,31 +78,47 @@ def unmorse(bot):
     """Translate from morse code"""
     while True:
         args, sender, channel = yield
-        newstring = ""
-        for char in args:
-            newstring += morse_dict.inv.get(char, char)
+        newstring = "".join(_MORSE_DECODE.get(char, char) for char in args)
         bot.msg(channel, newstring.lower(), length=510)
 
 
 def joke(bot):
     """Chuck Norris jokes from https://api.chucknorris.io/"""
-    url = "https://api.chucknorris.io/jokes/random"
+    # name -> channels waiting for the running request
+    pending = {}
 
-    @defer.inlineCallbacks
-    def _tell_joke(response, channel):
+    def _handle_response(response, name):
         if response.code < 200 or response.code >= 300:
-            bot.msg(channel, "Failed to fetch joke")
+            for channel in pending.pop(name, []):
+                bot.msg(channel, "Failed to fetch joke")
             return
-        data = yield response.json()
-        cnjoke = data['value']
-        bot.msg(channel, str(cnjoke), length=510)
+        return _json_content(response).addCallback(_tell_joke, name)
+
+    def _tell_joke(data, name):
+        joke = str(data['value'])
+        for channel in pending.pop(name, []):
+            bot.msg(channel, joke, length=510)
+
+    def _joke_failed(failure, name):
+        log.warn("Error fetching joke: {error}", error=failure.value)
+        for channel in pending.pop(name, []):
+            bot.msg(channel, "Failed to fetch joke")
 
     while True:
         args, sender, channel = yield
+        name = " ".join(args)
+        # don't fire another request while the same one is still running
+        if name in pending:
+            if channel not in pending[name]:
+                pending[name].append(channel)
+            continue
+        pending[name] = [channel]
         params = None
-        if args:
-            params = {"name": " ".join(args)}
-        get(url, params=params).addCallback(_tell_joke, channel)
+        if name:
+            params = {"name": name}
+        d = _get_http_client().get(_JOKE_URL, params=params, timeout=5)
+        d.addCallback(_handle_response, name)
+        d.addErrback(_joke_failed, name)
 
 
 if sys.version_info.major == 3 and sys.version_info.minor < 9:
@@ -103,70 +135,131 @@ if sys.version_info.major == 3 and sys.version_info.minor < 9:
 else:
     ArgParser = argparse.ArgumentParser
 
+_FORTUNE_PATHS = (r"/usr/share/fortune/", r"/usr/share/games/fortune/",
+                  r"/usr/share/fortunes/", r"/usr/share/games/fortunes/",
+                  fs.get_abs_path("fortunes"))
+_FORTUNE_NUM_LINES_SHORT = 3
+_FORTUNE_PARSER = ArgParser(exit_on_error=False)
+_FORTUNE_PARSER.add_argument("-l", action='store_true')
+_FORTUNE_PARSER.add_argument("-o", action='store_true')
+_FORTUNE_PARSER.add_argument("--list", action='store_true')
+_FORTUNE_PARSER.add_argument("files", nargs='*')
+
+
 def fortune(bot):
     """Unix fortune: fortune --list for available fortunes, -l to \
 allow long fortunes, -o to allow offensive fortunes"""
-    paths = [r"/usr/share/fortune/", r"/usr/share/games/fortune/",
-             r"/usr/share/fortunes/", r"/usr/share/games/fortunes/",
-             fs.get_abs_path("fortunes")]
-    num_lines_short = 3
-    parser = ArgParser(exit_on_error=False)
-    parser.add_argument("-l", action='store_true')
-    parser.add_argument("-o", action='store_true')
-    parser.add_argument("--list", action='store_true')
-    parser.add_argument("files", nargs='*')
-
-    def _display_filename(filename):
+    # offensive flag -> (scanned directory -> mtime, display name -> path)
+    found_files = {}
+
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def _scan_dir(path, prefix, offensive, fortune_files, dir_mtimes):
         """
-        Strip the fortune base path
+        Add the fortune files below <path> to <fortune_files>, their display
+        names start with <prefix>. The modification times of all scanned
+        directories are recorded in <dir_mtimes>
         """
-        for path in paths:
-            if filename.startswith(path):
-                return filename.replace(path, "", 1).lstrip("/")
+        # taken before listing, so that changes during the scan are noticed
+        dir_mtimes[path] = _mtime(path)
+        try:
+            entries = list(os.scandir(path))
+        except OSError:
+            return
+        subdirs = []
+        # files first, then the subdirectories - like os.walk, which doesn't
+        # descend into symlinked directories either
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if offensive or prefix or entry.name != "off":
+                    subdirs.append(entry)
+            elif "." not in entry.name and entry.is_file():
+                fortune_files.setdefault(prefix + entry.name, entry.path)
+        for entry in subdirs:
+            _scan_dir(entry.path, prefix + entry.name + "/", offensive,
+                      fortune_files, dir_mtimes)
 
     def _find_files(offensive=False):
         """
-        Find all fortune files in the system
+        Find all fortune files in the system - returns a dict mapping the
+        display names to the full paths
         """
-        fortune_files = []
+        cached = found_files.get(offensive)
+        # adding or removing files or directories in any of the scanned
+        # directories (including subdirectories) invalidates the file list
+        if cached is not None and all(_mtime(path) == mtime
+                                      for path, mtime in cached[0].items()):
+            return cached[1]
+        fortune_files = {}
+        dir_mtimes = {}
         # only one should be used, but check both anyways
-        for path in paths:
-            if not os.path.isdir(path):
-                continue
-            for root, dirs, files in os.walk(path):
-                for f in files:
-                    if "." in f:
-                        continue
-                    if offensive or not _display_filename(root) == 'off':
-                        fortune_files.append(os.path.join(root, f))
+        for path in _FORTUNE_PATHS:
+            _scan_dir(path, "", offensive, fortune_files, dir_mtimes)
+        found_files[offensive] = (dir_mtimes, fortune_files)
         return fortune_files
 
-    def _get_random_fortune(filename, onlyshort=True):
+    @_functools.lru_cache(maxsize=64)
+    def _index_fortunes(filename, mtime):
+        """
+        Return the (offset, length) of all (non-empty) fortunes of the file
+        <filename> and of the short ones among them - <mtime> is only part of
+        the cache key, so that changed files are indexed again
+        """
+        fortunes = []
+        short_fortunes = []
+        if not os.path.getsize(filename):
+            return fortunes, short_fortunes
+        with open(filename, "rb") as f, \
+                _mmap.mmap(f.fileno(), 0, access=_mmap.ACCESS_READ) as mm:
+            start = 0
+            while True:
+                line = mm.readline()
+                if line and line != b"%\n" and line != b"%":
+                    continue
+                end = mm.tell() - len(line)
+                # the separator follows a "\n" that isn't part of the fortune
+                if line:
+                    if end > start and mm[end - 1] == ord("\n"):
+                        end -= 1
+                else:
+                    while end > start and mm[end - 1] == ord("\n"):
+                        end -= 1
+                if end > start:
+                    fortunes.append((start, end - start))
+                    # last line has no "\n"
+                    if mm[start:end].count(b"\n") < _FORTUNE_NUM_LINES_SHORT:
+                        short_fortunes.append((start, end - start))
+                if not line:
+                    break
+                start = mm.tell()
+        return fortunes, short_fortunes
+
+    def _get_random_fortune(display_name, filename, onlyshort=True):
         """
         Get a random fortune out of the file <filename>
         """
-        with open(filename) as f:
-            data = f.read()
-        fortunes = data.split("\n%\n")
-        # remove empty strings
-        while "" in fortunes:
-            fortunes.remove("")
+        fortunes, short_fortunes = _index_fortunes(
+            filename, os.stat(filename).st_mtime)
         if onlyshort:
-            for fortune in fortunes[:]:
-                # last line has no "\n"
-                if fortune.count("\n") >= num_lines_short:
-                    fortunes.remove(fortune)
+            fortunes = short_fortunes
         if not fortunes:
             return "No fortunes found"
-        fortune = random.choice(fortunes)
-        if _display_filename(filename).startswith("off/"):
-            fortune = fortune.encode("rot13")
+        offset, length = random.choice(fortunes)
+        with open(filename, "rb") as f:
+            f.seek(offset)
+            fortune = f.read(length).decode("utf-8", errors="replace")
+        if display_name.startswith("off/"):
+            fortune = fortune.translate(_ROT13)
         return fortune
 
     while True:
         args, sender, channel = yield
         try:
-            options, unknown_options = parser.parse_known_args(args)
+            options, unknown_options = _FORTUNE_PARSER.parse_known_args(args)
         except Exception as e:
             log.warn("Error parsing fortune arguments: {e}", e=e)
             bot.msg(channel, formatting.colored("Invalid input for fortune",
@@ -179,27 +272,21 @@ allow long fortunes, -o to allow offensive fortunes"""
                                                 ColorCodes.red))
             continue
         if options.list:
-            fortunes = []
-            for f in _find_files(offensive=options.o):
-                fortunes.append(_display_filename(f))
             bot.msg(channel, "Available fortunes: {}".format(
-                ", ".join(fortunes)))
+                ", ".join(_find_files(offensive=options.o))))
         else:
-            considered_files = []
             only_short = not options.l
             if not options.files:
                 # Don't use offensive fortunes by default
-                considered_files = _find_files(offensive=options.o)
+                considered_files = list(_find_files(offensive=options.o).items())
             else:
-                for arg in options.files:
-                    for f in _find_files(offensive=True):
-                        if arg == _display_filename(f):
-                            considered_files.append(f)
-                            break
+                all_files = _find_files(offensive=True)
+                considered_files = [(arg, all_files[arg]) for arg in options.files
+                                    if arg in all_files]
             # nothing found?
             if not considered_files:
                 bot.msg(channel, "No fortunes found")
             else:
-                result = _get_random_fortune(random.choice(considered_files),
-                                             only_short)
+                result = _get_random_fortune(*random.choice(considered_files),
+                                             onlyshort=only_short)
                 bot.msg(channel, result)
@@ -14,19 +14,24 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from twisted.web import server
 from twisted.web.resource import Resource
 from twisted.web.template import Tag, tags
-from twisted.internet import reactor, defer
+from twisted.internet import reactor, defer, threads
 from twisted.python.failure import Failure
 from twisted.logger import Logger
 
-import codecs
+import binascii
+from collections import OrderedDict
 from enum import StrEnum
 from functools import partial, partialmethod
-from hashlib import sha1
 import hmac
-import json
 import textwrap
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    # json.loads accepts bytes as well
+    from json import loads as json_loads
 
 from util.formatting import ColorCodes, good_contrast_with_black, colored, from_human_readable
 from util.misc import str_to_bytes, bytes_to_str, filter_dict
@@ -34,6 +39,53 @@ from util.internet import shorten_url, DirectAccessor, HeaderAccessor, JsonAcces
 from lib import webhook_actions
 
 
+# X-Gitlab-Event header -> object_kind of the payload
+# Other hooks (e.g. "System Hook") can carry several kinds of events, so
+# those are only known after parsing the payload.
+_GITLAB_HOOK_EVENTS = {
+    "Push Hook": "push",
+    "Tag Push Hook": "tag_push",
+    "Issue Hook": "issue",
+    "Confidential Issue Hook": "issue",
+    "Note Hook": "note",
+    "Confidential Note Hook": "note",
+    "Merge Request Hook": "merge_request",
+    "Wiki Page Hook": "wiki_page",
+    "Pipeline Hook": "pipeline",
+    "Job Hook": "build",
+    "Deployment Hook": "deployment",
+    "Release Hook": "release",
+}
+# action -> color of the action in release messages
+_GITHUB_RELEASE_COLORS = {
+    "published": ColorCodes.darkgreen,
+    "created": ColorCodes.darkgreen,
+    "released": ColorCodes.darkgreen,
+    "prereleased": ColorCodes.darkcyan,
+    "unpublished": ColorCodes.red,
+    "deleted": ColorCodes.red,
+}
+# action -> (displayed action, color)
+_GITLAB_ISSUE_ACTIONS = {
+    "open": ("opened", ColorCodes.red),
+    "reopen": ("reopened", ColorCodes.red),
+    "close": ("closed", ColorCodes.darkgreen),
+    "update": ("updated", ColorCodes.darkorange),
+}
+_GITLAB_MR_ACTIONS = {
+    "open": ("opened", ColorCodes.darkgreen),
+    "reopen": ("reopened", ColorCodes.darkgreen),
+    "close": ("closed", ColorCodes.red),
+    "merge": ("merged", ColorCodes.darkgreen),
+    "update": ("updated", ColorCodes.darkorange),
+    "mark_as_draft": ("marked as draft:", ColorCodes.lightgray),
+    "mark_as_ready": ("marked as ready:", ColorCodes.darkgreen),
+    "approved": ("approved", ColorCodes.darkgreen),
+    "approval": ("added approval for", ColorCodes.darkgreen),
+    "unapproved": ("unapproved", ColorCodes.darkorange),
+    "unapproval": ("removed approval for", ColorCodes.darkorange),
+}
+
 class GitWebhookServer(Resource):
     """
     HTTP(S) Server for GitHub/Gitlab webhooks
@@ -41,6 +93,9 @@ class GitWebhookServer(Resource):
     isLeaf = True
     log = Logger()
     GH_ReviewFloodPrevention_Delay = 10
+    # payloads of at least this many bytes are parsed in a thread
+    JsonThreadThreshold = 64 * 1024
+    MaxCachedShortUrls = 1024
 
     HookType = StrEnum("HookType", ["Push"])
 
@@ -48,9 +103,17 @@ class GitWebhookServer(Resource):
         self.botfactory = botfactory
         self.github_secret = config["GitWebhook"].get("github_secret", None)
         self.gitlab_secret = config["GitWebhook"].get("gitlab_secret", None)
-        self.channels = GitWebhookServer._setup_repo_config_tree(
+        # keyed HMAC state that is copied for every request
+        self._github_hmac = None
+        if self.github_secret:
+            self._github_hmac = hmac.new(str_to_bytes(self.github_secret),
+                                         digestmod="sha1")
+        self._gitlab_token = None
+        if self.gitlab_secret:
+            self._gitlab_token = str_to_bytes(self.gitlab_secret)
+        self.channels = GitWebhookServer._setup_channel_config(
             config["GitWebhook"]["channels"])
-        self.confidential_channels = GitWebhookServer._setup_repo_config_tree(
+        self.confidential_channels = GitWebhookServer._setup_channel_config(
             config["GitWebhook"].get("confidential_channels", {}))
         # filter settings
         self.filter_rules = config["GitWebhook"].get("FilterRules", [])
@@ -76,6 +139,10 @@ class GitWebhookServer(Resource):
         self.hook_report_success = config["GitWebhook"].get("hook_report_success", True)
         # URL shortener
         self.url_shortener = defer.succeed
+        # long url -> short url, least recently used first
+        self._short_urls = OrderedDict()
+        # long url -> list of Deferreds waiting for a running request
+        self._pending_short_urls = {}
         url_shortener_settings = config["GitWebhook"].get("url_shortener", None)
         if url_shortener_settings:
             try:
@@ -99,15 +166,22 @@ class GitWebhookServer(Resource):
                         accessor = HeaderAccessor(**payload_accessor_settings[type_name])
                     else:
                         raise ValueError("No such payload_accessor: {}".format(type_name))
-                self.url_shortener = partial(shorten_url, service_url=service_url,
-                                             method=method, headers=headers,
-                                             post_data=post_data,
-                                             request_params=request_params,
-                                             payload_accessor=accessor)
+                self._shorten_url = partial(shorten_url, service_url=service_url,
+                                            method=method, headers=headers,
+                                            post_data=post_data,
+                                            request_params=request_params,
+                                            payload_accessor=accessor)
+                self.url_shortener = self._shorten_url_cached
             except Exception as e:
                 self.log.warn("Couldn't set up url shortener: {error}", error=e)
         # message templates
         self.load_message_templates(config["GitWebhook"].get("MessageTemplates", {}))
+        # event handlers, keyed by (service, eventtype)
+        self._handlers = {}
+        for name in dir(self):
+            if name.startswith(("on_github_", "on_gitlab_")):
+                service, eventtype = name[3:].split("_", 1)
+                self._handlers[(service, eventtype)] = getattr(self, name)
 
     def load_message_templates(self, message_config: dict) -> None:
         crumbs = {}
@@ -136,6 +210,31 @@ class GitWebhookServer(Resource):
         self.gitlab_note_stub = from_human_readable(message_config.get("gitlab_note_stub", '{reponame_stub} {user_stub} commented on <t:slot name="noteable_type"/> <t:slot name="id_prefix"/><font color="darkorange"><t:slot name="id"/></font> <a><t:attr name="href"><t:slot name="url"/></t:attr><t:slot name="title"/></a>').format(**crumbs))
         self.gitlab_mr_stub = from_human_readable(message_config.get("gitlab_mr_stub", '{reponame_stub} {user_stub} {action_stub} Merge Request !<font color="darkorange"><t:slot name="id"/></font> <a><t:attr name="href"><t:slot name="url"/></t:attr><t:slot name="title"/> (<font color="magenta"><t:slot name="source"/></font>-&gt;<font color="red"><t:slot name="target"/></font>)</a>').format(**crumbs))
 
+    def _shorten_url_cached(self, url):
+        """
+        Shorten url with the configured service, reusing earlier results and
+        requests that are still running for the same url.
+        """
+        if url in self._short_urls:
+            self._short_urls.move_to_end(url)
+            return defer.succeed(self._short_urls[url])
+        d = defer.Deferred()
+        if url in self._pending_short_urls:
+            self._pending_short_urls[url].append(d)
+            return d
+        self._pending_short_urls[url] = [d]
+        self._shorten_url(url).addCallback(self._cache_short_url, url)
+        return d
+
+    def _cache_short_url(self, short_url, url):
+        # shorten_url falls back to the long url on errors, don't keep those
+        if short_url != url:
+            self._short_urls[url] = short_url
+            if len(self._short_urls) > self.MaxCachedShortUrls:
+                self._short_urls.popitem(last=False)
+        for d in self._pending_short_urls.pop(url, []):
+            d.callback(short_url)
+
     @staticmethod
     def _setup_repo_config_tree(config: dict) -> dict:
         repo_config_tree: dict = {}
@@ -155,6 +254,16 @@ class GitWebhookServer(Resource):
             repo_config_tree[adjusted_key] = subconfig
         return repo_config_tree
 
+    @staticmethod
+    def _setup_channel_config(config: dict) -> dict:
+        channel_config = GitWebhookServer._setup_repo_config_tree(config)
+        for key, channels in channel_config.items():
+            # don't error out if the config has a string instead of a list,
+            # but keep empty values falsy so the fallbacks still apply
+            if channels and not isinstance(channels, list):
+                channel_config[key] = [channels]
+        return channel_config
+
     @staticmethod
     def _setup_hooks(config: dict) -> dict:
         hook_config: dict = {}
@@ -179,60 +288,115 @@ class GitWebhookServer(Resource):
         return config_tree.get("*/*", None)
 
     def render_POST(self, request):
+        service, eventtype = GitWebhookServer._get_event_from_headers(request)
+        # other: not implemented
+        if service is None:
+            request.setResponseCode(403)
+            return b""
+        # don't bother reading, verifying and parsing events we can't handle
+        if eventtype is not None and (service, eventtype) not in self._handlers:
+            self.log.warn("Event {eventtype} not implemented for service "
+                          "{service}", eventtype=eventtype, service=service)
+            request.setResponseCode(200)
+            return b""
         body = request.content.read()
-        data = json.loads(bytes_to_str(body))
-        service = None
-        # GitHub
-        if request.getHeader(b"X-GitHub-Event"):
-            eventtype = bytes_to_str(request.getHeader(b"X-GitHub-Event"))
+        if len(body) < GitWebhookServer.JsonThreadThreshold:
+            try:
+                data = json_loads(body)
+            except ValueError as e:
+                self._payload_invalid(Failure(e), request)
+            else:
+                self.handle_payload(request, service, eventtype, body, data)
+            return b""
+        # the client may hang up while the payload is being parsed
+        connection_lost = []
+        request.notifyFinish().addErrback(connection_lost.append)
+        # don't block the reactor while parsing big payloads
+        d = threads.deferToThread(json_loads, body)
+        d.addCallbacks(lambda data: self.handle_payload(request, service,
+                                                        eventtype, body, data),
+                       self._payload_invalid, errbackArgs=(request,))
+        d.addErrback(self._payload_failed, request)
+        d.addBoth(self._finish_request, request, connection_lost)
+        return server.NOT_DONE_YET
+
+    def _payload_invalid(self, failure, request):
+        failure.trap(ValueError)
+        self.log.warn("Couldn't parse webhook payload: {error}",
+                      error=failure.getErrorMessage())
+        request.setResponseCode(400)
+
+    def _payload_failed(self, failure, request):
+        self.log.warn("Couldn't handle webhook payload: {error}",
+                      error=failure.getErrorMessage())
+        request.setResponseCode(500)
+
+    def _finish_request(self, _, request, connection_lost):
+        if not connection_lost:
+            request.finish()
+
+    @staticmethod
+    def _get_event_from_headers(request):
+        """
+        Returns the service and the event type announced by the request
+        headers, or (None, None) if the request is from an unknown service.
+        The event type is None if it can only be taken from the payload.
+        """
+        if github_event := request.getHeader(b"X-GitHub-Event"):
+            return "github", bytes_to_str(github_event)
+        if gitlab_event := request.getHeader(b"X-Gitlab-Event"):
+            return "gitlab", _GITLAB_HOOK_EVENTS.get(bytes_to_str(gitlab_event))
+        return None, None
+
+    def handle_payload(self, request, service, eventtype, body, data):
+        """
+        Check the signature of the parsed webhook payload and dispatch it
+        to the event handler
+        """
+        if service == "github":
             sig = request.getHeader(b"X-Hub-Signature")
             if sig:
                 sig = sig[5:]
-            service = "github"
-        # Gitlab
-        elif request.getHeader(b"X-Gitlab-Event"):
+        else:
+            # the payload is more precise than the X-Gitlab-Event header
             eventtype = data["object_kind"]
             sig = request.getHeader(b"X-Gitlab-Token")
-            service = "gitlab"
-        # other: not implemented
-        else:
-            request.setResponseCode(403)
-            return b""
 
-        secret = None
-        if service == "github":
-            secret = self.github_secret
-        elif service == "gitlab":
-            secret = self.gitlab_secret
-        if secret:
-            secret = str_to_bytes(secret)
-            if service == "github":
-                h = hmac.new(secret, body, sha1)
-                if not hmac.compare_digest(codecs.encode(h.digest(), "hex"), sig):
-                    self.log.warn("Request's signature does not correspond"
-                                  " with the given secret - ignoring request")
-                    request.setResponseCode(200)
-                    return b""
-            else:
-                if secret != sig:
-                    self.log.warn("Request's signature does not correspond"
-                                  " with the given secret - ignoring request")
-                    request.setResponseCode(200)
-                    return b""
+        if service == "github" and self._github_hmac:
+            try:
+                sig = binascii.unhexlify(sig)
+            except (TypeError, binascii.Error):
+                # missing or malformed signature
+                sig = b""
+            h = self._github_hmac.copy()
+            h.update(body)
+            if not hmac.compare_digest(h.digest(), sig):
+                self.log.warn("Request's signature does not correspond"
+                              " with the given secret - ignoring request")
+                request.setResponseCode(200)
+                return
+        elif service == "gitlab" and self._gitlab_token:
+            if not hmac.compare_digest(self._gitlab_token, sig or b""):
+                self.log.warn("Request's signature does not correspond"
+                              " with the given secret - ignoring request")
+                request.setResponseCode(200)
+                return
         # insert pseudo keys into data for better filtering
         GitWebhookServer.insert_pseudo_data(service, data, eventtype)
         if self.filter_event(data):
             self.log.debug("filtering out event {event}", event=data)
-        elif hasattr(self, "on_{}_{}".format(service, eventtype)):
-            reactor.callLater(0, getattr(self, "on_{}_{}".format(service,
-                                                                 eventtype)),
-                              data)
+        elif handler := self._handlers.get((service, eventtype)):
+            d = defer.maybeDeferred(handler, data)
+            d.addErrback(self._handler_failed, service, eventtype)
         else:
             self.log.warn("Event {eventtype} not implemented for service "
                           "{service}", eventtype=eventtype, service=service)
         # always return 200
         request.setResponseCode(200)
-        return b""
+
+    def _handler_failed(self, failure, service, eventtype):
+        self.log.failure("Handling {service} event {eventtype} failed",
+                         failure, service=service, eventtype=eventtype)
 
     @staticmethod
     def insert_pseudo_data(service, data, eventtype):
@@ -351,9 +515,6 @@ class GitWebhookServer(Resource):
                           "channel is configured for it, ignoring...",
                           space=repo_space, repo=repo_name)
             return
-        if not isinstance(channels, list):
-            # don't error out if the config has a string instead of a list
-            channels = [channels]
         for channel in channels:
             self.botfactory.bot.msg(channel, message)
 
@@ -382,12 +543,11 @@ class GitWebhookServer(Resource):
     @defer.inlineCallbacks
     def format_commits(self, commits, num_commits):
         msg = Tag("")
-        for i, commit in enumerate(commits):
-            if i == 3 and num_commits != 4:
-                msg.children.append(tags.br)
-                msg.children.append("+{} more commits".format(num_commits - 3))
-                break
-            url = yield self.url_shortener(commit["url"])
+        shown = commits if num_commits == 4 else commits[:3]
+        # shorten all urls at once instead of one request after the other
+        urls = yield defer.gatherResults([self.url_shortener(commit["url"])
+                                          for commit in shown])
+        for i, (commit, url) in enumerate(zip(shown, urls)):
             message = commit["message"].split("\n")[0]
             if i != 0:
                 msg.children.append(tags.br)
@@ -396,6 +556,9 @@ class GitWebhookServer(Resource):
                            message=textwrap.shorten(message, 100),
                            url=url)
             msg.children.append(line)
+        if len(commits) > len(shown):
+            msg.children.append(tags.br)
+            msg.children.append("+{} more commits".format(num_commits - 3))
         return msg
 
     @defer.inlineCallbacks
@@ -429,14 +592,15 @@ class GitWebhookServer(Resource):
                                 msg)
         # subset of information that is common for both GitHub and GitLab
         # only a few useful pieces of information
+        repository = data["repository"]
         subset = {"commits": data["commits"],
                   "branch": branch,
-                  "project": {"name": data["repository"]["name"],
-                              "namespace": data["repository"]["full_name"].split(
+                  "project": {"name": repository["name"],
+                              "namespace": repository["full_name"].split(
                                   "/")[0],
-                              "description": data["repository"]["description"],
-                              "url": data["repository"]["html_url"],
-                              "homepage": data["repository"]["homepage"]},
+                              "description": repository["description"],
+                              "url": repository["html_url"],
+                              "homepage": repository["homepage"]},
                   "pusher": {"name": data["pusher"]["name"],
                              "username": data["sender"]["login"],
                              "id": data["sender"]["id"]}}
@@ -444,18 +608,19 @@ class GitWebhookServer(Resource):
 
     @defer.inlineCallbacks
     def on_github_issues(self, data):
+        issue = data["issue"]
         action = data["action"]
         payload = None
         repo_name = data["repository"]["name"]
-        issue_url = yield self.url_shortener(data["issue"]["html_url"])
+        issue_url = yield self.url_shortener(issue["html_url"])
         actioncolor = ColorCodes.darkorange
         if action == "assigned" or action == "unassigned":
-            payload = data["issue"]["assignee"]["login"]
+            payload = issue["assignee"]["login"]
         elif action == "labeled" or action == "unlabeled":
             fg, bg = self.github_label_colors(data["label"])
             payload = colored(data["label"]["name"], fg, bg)
         elif action == "milestoned":
-            payload = data["issue"]["milestone"]["title"]
+            payload = issue["milestone"]["title"]
         elif action == "opened":
             actioncolor = ColorCodes.red
         elif action == "reopened":
@@ -465,8 +630,8 @@ class GitWebhookServer(Resource):
         msg = self.issue_stub.clone()
         msg.fillSlots(repo_name=repo_name, user=data["sender"]["login"],
                       action=action, actioncolor=actioncolor,
-                      issue_id=str(data["issue"]["number"]),
-                      issue_title=data["issue"]["title"],
+                      issue_id=str(issue["number"]),
+                      issue_title=issue["title"],
                       issue_url=issue_url)
         if payload:
             msg.children.append(": ")
@@ -477,8 +642,9 @@ class GitWebhookServer(Resource):
 
     @defer.inlineCallbacks
     def on_github_issue_comment(self, data):
+        issue = data["issue"]
         comment_url = yield self.url_shortener(data["comment"]["html_url"])
-        issue_url = yield self.url_shortener(data["issue"]["html_url"])
+        issue_url = yield self.url_shortener(issue["html_url"])
         repo_name = data["repository"]["name"]
         action = data["action"]
         if action == "created":
@@ -490,8 +656,8 @@ class GitWebhookServer(Resource):
         msg = self.issue_comment_stub.clone()
         msg.fillSlots(repo_name=repo_name, user=data["comment"]["user"]["login"],
                       action=action, actioncolor=actioncolor,
-                      issue_id=str(data["issue"]["number"]),
-                      issue_title=data["issue"]["title"],
+                      issue_id=str(issue["number"]),
+                      issue_title=issue["title"],
                       issue_url=issue_url,
                       comment_url=comment_url)
         self.report_to_chat(repo_name,
@@ -543,13 +709,7 @@ class GitWebhookServer(Resource):
     def on_github_release(self, data):
         repo_name = data["repository"]["name"]
         action = data["action"]
-        actioncolor = ColorCodes.darkorange
-        if action in ("published", "created", "released"):
-            actioncolor = ColorCodes.darkgreen
-        elif action == "prereleased":
-            actioncolor = ColorCodes.darkcyan
-        elif action in ("unpublished", "deleted"):
-            actioncolor = ColorCodes.red
+        actioncolor = _GITHUB_RELEASE_COLORS.get(action, ColorCodes.darkorange)
         release_name = data["release"]["name"] or data["release"]["tag_name"]
         if data["release"]["draft"]:
             release_name += " (Draft)"
@@ -567,19 +727,20 @@ class GitWebhookServer(Resource):
 
     @defer.inlineCallbacks
     def on_github_pull_request(self, data):
+        pr = data["pull_request"]
         action = data["action"]
         payload = None
         repo_name = data["repository"]["name"]
         user = data["sender"]["login"]
         actioncolor = ColorCodes.darkorange
         if action == "assigned" or action == "unassigned":
-            payload = data["pull_request"]["assignee"]["login"]
+            payload = pr["assignee"]["login"]
         elif action == "labeled" or action == "unlabeled":
             fg, bg = self.github_label_colors(data["label"])
             payload = colored(data["label"]["name"], fg, bg)
         elif action == "milestoned":
             action = "set milestone"
-            payload = data["pull_request"]["milestone"]["title"]
+            payload = pr["milestone"]["title"]
         elif action == "review_requested":
             action = "requested review for"
             payload = data["requested_reviewer"]["login"]
@@ -591,10 +752,10 @@ class GitWebhookServer(Resource):
         elif action == "reopened":
             actioncolor = ColorCodes.darkgreen
         elif action == "closed":
-            if data["pull_request"]["merged"]:
+            if pr["merged"]:
                 action = "merged"
                 actioncolor = ColorCodes.darkgreen
-                user = data["pull_request"]["merged_by"]["login"]
+                user = pr["merged_by"]["login"]
             else:
                 actioncolor = ColorCodes.red
         elif action == "synchronize":
@@ -603,15 +764,15 @@ class GitWebhookServer(Resource):
             action = "marked ready for review:"
         elif action == "converted_to_draft":
             action = "converted to draft:"
-        url = yield self.url_shortener(data["pull_request"]["html_url"])
-        head = GitWebhookServer._github_get_pr_head_display_ref(data["pull_request"])
+        url = yield self.url_shortener(pr["html_url"])
+        head = GitWebhookServer._github_get_pr_head_display_ref(pr)
         msg = self.pr_stub.clone()
         msg.fillSlots(repo_name=repo_name, user=user, action=action,
                       actioncolor=actioncolor,
-                      pr_id=str(data["pull_request"]["number"]),
-                      pr_title=data["pull_request"]["title"],
+                      pr_id=str(pr["number"]),
+                      pr_title=pr["title"],
                       pr_url=url, head=head,
-                      base=data["pull_request"]["base"]["ref"])
+                      base=pr["base"]["ref"])
         if payload:
             msg.children.append(": ")
             msg.children.append(payload)
@@ -658,16 +819,20 @@ class GitWebhookServer(Resource):
             if key not in partition:
                 partition[key] = []
             partition[key].append(event)
+        # shorten the urls of all partitions at once, without duplicates
+        full_urls = list(dict.fromkeys(event[type_]["html_url"]
+                                       for event in buffer))
+        short_urls = yield defer.gatherResults([self.url_shortener(url)
+                                                for url in full_urls])
+        short_urls = dict(zip(full_urls, short_urls))
         for k, events in partition.items():
             repo_space, repo_name, pr_number, user, action = k
             title = events[0]["pull_request"]["title"]
             head = GitWebhookServer._github_get_pr_head_display_ref(events[0]["pull_request"])
             base = events[0]["pull_request"]["base"]["ref"]
-            # remove duplicate urls
-            full_urls = {e[type_]["html_url"] for e in events}
-            urls_defers = [self.url_shortener(url) for url in full_urls]
-            results = yield defer.DeferredList(urls_defers)
-            urls = [res[1] for res in results]
+            # remove duplicate urls, keeping the order they came in
+            urls = [short_urls[url] for url in
+                    dict.fromkeys(e[type_]["html_url"] for e in events)]
             self._github_PR_review_send_msg(is_comment, repo_name, repo_space,
                                             user, pr_number, title, action,
                                             head, base, urls)
@@ -677,22 +842,26 @@ class GitWebhookServer(Resource):
         if self.prevent_github_review_flood:
             self._gh_review_buffer.append(data)
             if self._gh_review_delayed_call:
-                self._gh_review_delayed_call.cancel()
-            self._gh_review_delayed_call = reactor.callLater(
-                GitWebhookServer.GH_ReviewFloodPrevention_Delay,
-                self.github_handle_review_flood, False)
+                # postponing is cheaper than cancelling and rescheduling
+                self._gh_review_delayed_call.reset(
+                    GitWebhookServer.GH_ReviewFloodPrevention_Delay)
+            else:
+                self._gh_review_delayed_call = reactor.callLater(
+                    GitWebhookServer.GH_ReviewFloodPrevention_Delay,
+                    self.github_handle_review_flood, False)
         else:
+            pr = data["pull_request"]
             url = yield self.url_shortener(data["review"]["html_url"])
             self._github_PR_review_send_msg(
                 False,
                 data["repository"]["name"],
                 GitWebhookServer._github_get_namespace(data),
                 data["review"]["user"]["login"],
-                data["pull_request"]["number"],
-                data["pull_request"]["title"],
+                pr["number"],
+                pr["title"],
                 data["action"],
-                GitWebhookServer._github_get_pr_head_display_ref(data["pull_request"]),
-                data["pull_request"]["base"]["ref"],
+                GitWebhookServer._github_get_pr_head_display_ref(pr),
+                pr["base"]["ref"],
                 [url])
 
     @defer.inlineCallbacks
@@ -700,22 +869,26 @@ class GitWebhookServer(Resource):
         if self.prevent_github_review_flood:
             self._gh_review_comment_buffer.append(data)
             if self._gh_review_comment_delayed_call:
-                self._gh_review_comment_delayed_call.cancel()
-            self._gh_review_comment_delayed_call = reactor.callLater(
-                GitWebhookServer.GH_ReviewFloodPrevention_Delay,
-                self.github_handle_review_flood, True)
+                # postponing is cheaper than cancelling and rescheduling
+                self._gh_review_comment_delayed_call.reset(
+                    GitWebhookServer.GH_ReviewFloodPrevention_Delay)
+            else:
+                self._gh_review_comment_delayed_call = reactor.callLater(
+                    GitWebhookServer.GH_ReviewFloodPrevention_Delay,
+                    self.github_handle_review_flood, True)
         else:
+            pr = data["pull_request"]
             url = yield self.url_shortener(data["comment"]["html_url"])
             self._github_PR_review_send_msg(
                 True,
                 data["repository"]["name"],
                 GitWebhookServer._github_get_namespace(data),
                 data["comment"]["user"]["login"],
-                data["pull_request"]["number"],
-                data["pull_request"]["title"],
+                pr["number"],
+                pr["title"],
                 data["action"],
-                GitWebhookServer._github_get_pr_head_display_ref(data["pull_request"]),
-                data["pull_request"]["base"]["ref"],
+                GitWebhookServer._github_get_pr_head_display_ref(pr),
+                pr["base"]["ref"],
                 [url])
 
     @defer.inlineCallbacks
@@ -789,19 +962,8 @@ class GitWebhookServer(Resource):
     def on_gitlab_issue(self, data):
         repo_name = data["project"]["name"]
         attribs = data["object_attributes"]
-        action = attribs["action"]
-        actioncolor = ColorCodes.darkorange
-        if action == "open":
-            action = "opened"
-            actioncolor = ColorCodes.red
-        elif action == "reopen":
-            action = "reopened"
-            actioncolor = ColorCodes.red
-        elif action == "close":
-            action = "closed"
-            actioncolor = ColorCodes.darkgreen
-        elif action == "update":
-            action = "updated"
+        action, actioncolor = _GITLAB_ISSUE_ACTIONS.get(
+            attribs["action"], (attribs["action"], ColorCodes.darkorange))
         url = yield self.url_shortener(attribs["url"])
         msg = self.issue_stub.clone()
         msg.fillSlots(repo_name=repo_name, user=data["user"]["name"],
@@ -852,40 +1014,9 @@ class GitWebhookServer(Resource):
     def on_gitlab_merge_request(self, data):
         attribs = data["object_attributes"]
         repo_name = attribs["target"]["name"]
-        action = attribs["_extended_action"]
-        actioncolor = ColorCodes.darkorange
-        if action == "open":
-            action = "opened"
-            actioncolor = ColorCodes.darkgreen
-        elif action == "reopen":
-            action = "reopened"
-            actioncolor = ColorCodes.darkgreen
-        elif action == "close":
-            action = "closed"
-            actioncolor = ColorCodes.red
-        elif action == "merge":
-            action = "merged"
-            actioncolor = ColorCodes.darkgreen
-        elif action == "update":
-            action = "updated"
-        elif action == "mark_as_draft":
-            action = "marked as draft:"
-            actioncolor = ColorCodes.lightgray
-        elif action == "mark_as_ready":
-            action = "marked as ready:"
-            actioncolor = ColorCodes.darkgreen
-        elif action == "approved":
-            action = "approved"
-            actioncolor = ColorCodes.darkgreen
-        elif action == "approval":
-            action = "added approval for"
-            actioncolor = ColorCodes.darkgreen
-        elif action == "unapproved":
-            action = "unapproved"
-            actioncolor = ColorCodes.darkorange
-        elif action == "unapproval":
-            action = "removed approval for"
-            actioncolor = ColorCodes.darkorange
+        action, actioncolor = _GITLAB_MR_ACTIONS.get(
+            attribs["_extended_action"],
+            (attribs["_extended_action"], ColorCodes.darkorange))
         url = yield self.url_shortener(attribs["url"])
         msg = self.gitlab_mr_stub.clone()
         msg.fillSlots(repo_name=repo_name, user=data["user"]["name"],
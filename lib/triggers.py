@@ -14,8 +14,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from collections import OrderedDict
 import re
-from twisted.internet import threads
+from twisted.internet import defer, threads
 from twisted.logger import Logger
 import sys
 import random
@@ -41,6 +42,9 @@ def youtube(bot, config):
     duration_pattern = re.compile(r"PT(?P<hours>[0-9]{1,2}H)?(?P<minutes>"
                                   "[0-9]{1,2}M)?(?P<seconds>[0-9]{1,2}S)")
     yt_service = None
+    # video id -> API response, least recently used first
+    video_cache = OrderedDict()
+    max_cached_videos = 128
     YOUTUBE_API_KEY = config.get("youtube_api_key", None)
     if YOUTUBE_API_KEY:
         from apiclient.discovery import build
@@ -51,9 +55,16 @@ def youtube(bot, config):
                            developerKey=YOUTUBE_API_KEY)
         yt_videos = yt_service.videos()
 
+    def _cache_response(response, video_id):
+        video_cache[video_id] = response
+        if len(video_cache) > max_cached_videos:
+            video_cache.popitem(last=False)
+        return response
+
     def _send_title(response, channel):
-        title = response["items"][0]["snippet"]["title"].encode("utf-8")
-        duration_str = response["items"][0]["contentDetails"]["duration"]
+        item = response["items"][0]
+        title = item["snippet"]["title"]
+        duration_str = item["contentDetails"]["duration"]
         time_match = duration_pattern.search(duration_str)
         gd = time_match.groupdict()
         duration = ""
@@ -69,21 +80,39 @@ def youtube(bot, config):
         bot.msg(channel, "Youtube Video title: {} ({})".format(title,
                                                                duration),
                 length=510)
+        return response
+
+    def _title_failed(failure, video_id):
+        # don't keep responses we can't handle
+        video_cache.pop(video_id, None)
+        logger.warn("Couldn't send title of youtube video {video_id}: "
+                    "{error}", video_id=video_id,
+                    error=failure.getErrorMessage())
 
     while True:
         message, sender, channel = yield
         if not yt_service:
-            print("No youtube API key set, can't fetch youtube video titles")
+            logger.warn("No youtube API key set, can't fetch youtube video "
+                        "titles")
             continue
         match = pat.search(message)
         if match is not None:
             # get the video id
             video_id = match.group(1)
+            if video_id in video_cache:
+                video_cache.move_to_end(video_id)
+                d = defer.maybeDeferred(_send_title, video_cache[video_id],
+                                        channel)
+                d.addErrback(_title_failed, video_id)
+                continue
             # Don't block the main thread
             request = yt_videos.list(id=video_id, part="snippet,"
                                      "contentDetails", maxResults="1")
             d = threads.deferToThread(request.execute)
             d.addCallback(_send_title, channel)
+            # only cache responses that could be sent
+            d.addCallback(_cache_response, video_id)
+            d.addErrback(_title_failed, video_id)
 
 
 def import_this(bot, config):
@@ -96,22 +125,23 @@ def import_this(bot, config):
         bot.msg(channel, zen)
 
 
-def enable_command(bot, config):
-    """Enable command or trigger with python-like syntax"""
-    def _enable(is_admin, channel, _type, cmd, name):
-        if not is_admin:
-            return
-
-        if _type == "commands":
-            success = bot.enable_command(cmd, name, add_to_config=True)
-        elif _type == "triggers":
-            success = bot.enable_trigger(cmd)
-        else:
-            raise RuntimeError("Something went horribly wrong")
+def _enable(is_admin, bot, channel, _type, cmd, name):
+    if not is_admin:
+        return
 
-        if not success:
-            bot.msg(channel, "ImportError: No module named {}".format(cmd))
+    if _type == "commands":
+        success = bot.enable_command(cmd, name, add_to_config=True)
+    elif _type == "triggers":
+        success = bot.enable_trigger(cmd)
+    else:
+        raise RuntimeError("Something went horribly wrong")
 
+    if not success:
+        bot.msg(channel, "ImportError: No module named {}".format(cmd))
+
+
+def enable_command(bot, config):
+    """Enable command or trigger with python-like syntax"""
     while True:
         message, sender, channel = yield
         pat = re.compile(r"^from {}\.(?P<type>commands|triggers) import"
@@ -123,7 +153,7 @@ def enable_command(bot, config):
         cmd = match.groupdict()["cmd"]
         name = match.groupdict()["name"]
 
-        bot.is_user_admin(sender).addCallback(_enable, channel, _type,
+        bot.is_user_admin(sender).addCallback(_enable, bot, channel, _type,
                                               cmd, name)
 
 
@@ -0,0 +1,170 @@
+# PyTIBot - IRC Bot using python and the twisted library
+# Copyright (C) <2023>  <Sebastian Schmidt>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from io import BytesIO
+import json
+
+from twisted.internet import defer, threads
+from twisted.trial import unittest
+
+from lib.git_webhook import GitWebhookServer
+from util.formatting import to_plaintext
+
+
+class _FakeBot:
+    def __init__(self):
+        self.messages = []
+
+    def msg(self, channel, message):
+        self.messages.append((channel, to_plaintext(message)))
+
+
+class _FakeBotFactory:
+    def __init__(self):
+        self.bot = _FakeBot()
+
+
+class _FakeRequest:
+    def __init__(self, body, headers):
+        self.content = BytesIO(body)
+        self.headers = headers
+        self.code = None
+        self.finished = False
+        self._finish_notifications = []
+
+    def getHeader(self, name):
+        return self.headers.get(name)
+
+    def setResponseCode(self, code):
+        self.code = code
+
+    def notifyFinish(self):
+        d = defer.Deferred()
+        self._finish_notifications.append(d)
+        return d
+
+    def finish(self):
+        self.finished = True
+        for d in self._finish_notifications:
+            d.callback(None)
+
+    def lose_connection(self):
+        for d in self._finish_notifications:
+            d.errback(Exception("Connection lost"))
+
+
+class GitlabWebhookTestCase(unittest.TestCase):
+    def setUp(self):
+        self.factory = _FakeBotFactory()
+        config = {"GitWebhook": {"channels": {"default": "#commits"}}}
+        self.server = GitWebhookServer(self.factory, config)
+
+    def _post(self, event, data):
+        request = _FakeRequest(json.dumps(data).encode("utf-8"),
+                               {b"X-Gitlab-Event": event})
+        self.server.render_POST(request)
+        return request
+
+    def _push_payload(self):
+        return {"object_kind": "push",
+                "ref": "refs/heads/main",
+                "checkout_sha": "abc",
+                "user_name": "Jane",
+                "user_username": "jane",
+                "user_id": 1,
+                "total_commits_count": 1,
+                "commits": [{"url": "https://example.com/c/abc",
+                             "message": "Fix things\n\nbody",
+                             "author": {"name": "Jane"}}],
+                "project": {"name": "repo",
+                            "namespace": "group",
+                            "path_with_namespace": "group/repo",
+                            "description": "",
+                            "http_url": "https://example.com/group/repo.git",
+                            "homepage": "https://example.com/group/repo"}}
+
+    def test_push_hook(self):
+        request = self._post(b"Push Hook", self._push_payload())
+        self.assertEqual(request.code, 200)
+        self.assertEqual(self.factory.bot.messages,
+                         [("#commits", "[repo] Jane pushed 1 commit(s) to "
+                           "main\nJane: Fix things "
+                           "(https://example.com/c/abc)")])
+
+    def test_system_hook_push(self):
+        # system hooks send all kinds of events, the payload tells which
+        request = self._post(b"System Hook", self._push_payload())
+        self.assertEqual(request.code, 200)
+        self.assertEqual(self.factory.bot.messages,
+                         [("#commits", "[repo] Jane pushed 1 commit(s) to "
+                           "main\nJane: Fix things "
+                           "(https://example.com/c/abc)")])
+
+    def test_invalid_payload(self):
+        request = _FakeRequest(b"{not json", {b"X-Gitlab-Event": b"Push Hook"})
+        self.server.render_POST(request)
+        self.assertEqual(request.code, 400)
+
+    def test_large_push_hook(self):
+        self.patch(threads, "deferToThread", defer.maybeDeferred)
+        data = self._push_payload()
+        data["padding"] = "x" * GitWebhookServer.JsonThreadThreshold
+        request = self._post(b"Push Hook", data)
+        self.assertEqual(request.code, 200)
+        self.assertTrue(request.finished)
+        self.assertEqual(len(self.factory.bot.messages), 1)
+
+    def test_large_invalid_payload(self):
+        self.patch(threads, "deferToThread", defer.maybeDeferred)
+        body = b"{not json" * GitWebhookServer.JsonThreadThreshold
+        request = _FakeRequest(body, {b"X-Gitlab-Event": b"Push Hook"})
+        self.server.render_POST(request)
+        self.assertEqual(request.code, 400)
+        self.assertTrue(request.finished)
+
+    def test_large_payload_after_disconnect(self):
+        parsing = defer.Deferred()
+        self.patch(threads, "deferToThread", lambda f, body: parsing)
+        data = self._push_payload()
+        data["padding"] = "x" * GitWebhookServer.JsonThreadThreshold
+        body = json.dumps(data).encode("utf-8")
+        request = _FakeRequest(body, {b"X-Gitlab-Event": b"Push Hook"})
+        self.server.render_POST(request)
+        request.lose_connection()
+        parsing.callback(data)
+        self.assertFalse(request.finished)
+
+    def test_unhandled_hook_is_not_parsed(self):
+        request = _FakeRequest(b"not json", {b"X-Gitlab-Event":
+                                             b"Pipeline Hook"})
+        self.server.render_POST(request)
+        self.assertEqual(request.code, 200)
+        self.assertEqual(self.factory.bot.messages, [])
+
+
+class ChannelConfigTestCase(unittest.TestCase):
+    def test_single_channel_is_wrapped(self):
+        config = GitWebhookServer._setup_channel_config({"group/repo": "#a"})
+        self.assertEqual(config, {"group/repo": ["#a"]})
+
+    def test_empty_channel_falls_back_to_default(self):
+        config = GitWebhookServer._setup_channel_config({"default": "#a",
+                                                         "group/repo": None,
+                                                         "other": ""})
+        self.assertEqual(GitWebhookServer._select_repo_config(
+            "repo", "group", config), ["#a"])
+        self.assertEqual(GitWebhookServer._select_repo_config(
+            "other", "group", config), ["#a"])
@@ -357,6 +357,27 @@ class IrcFormattingTestCase(unittest.TestCase):
                               "\x03" + fg.value + "foo \x0304a\x0307b\x0309c"
                               "\x0311d\x0312e\x0313f bar\x03")
 
+    def test_rainbow_lengths(self):
+        # fewer characters than colors
+        msg = Tag("")(Tag("rainbow")("a"))
+        self._test_formatting(msg, "\x0304a\x03")
+        msg = Tag("")(Tag("rainbow")("abc"))
+        self._test_formatting(msg, "\x0304a\x0309b\x0312c\x03")
+        # uneven runs of colors
+        msg = Tag("")(Tag("rainbow")("abcdefg"))
+        self._test_formatting(msg,
+                              "\x0304ab\x0307c\x0309d\x0311e\x0312f"
+                              "\x0313g\x03")
+        # several characters per color
+        msg = Tag("")(Tag("rainbow")("abcdefghijkl"))
+        self._test_formatting(msg,
+                              "\x0304ab\x0307cd\x0309ef\x0311gh\x0312ij"
+                              "\x0313kl\x03")
+        msg = Tag("")(Tag("rainbow")("abcdefghijklm"))
+        self._test_formatting(msg,
+                              "\x0304abc\x0307de\x0309fg\x0311hi"
+                              "\x0312jk\x0313lm\x03")
+
     def test_nested_with_href(self):
         msg = Tag("")("foo", tags.a(tags.b("foo"), href="example.com"))
         self._test_formatting(msg, "foo\x02foo\x02 (example.com)")
@@ -0,0 +1,76 @@
+# PyTIBot - IRC Bot using python and the twisted library
+# Copyright (C) <2023>  <Sebastian Schmidt>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from twisted.trial import unittest
+
+from util.misc import filter_dict
+
+
+class FilterDictTestCase(unittest.TestCase):
+    data = {"eventtype": "push",
+            "ref": "refs/heads/main",
+            "count": 3,
+            "repository": {"name": "PyTIBot",
+                           "owner": {"login": "DefaultUser"}},
+            "commits": [{"author": {"name": "bot"}},
+                        {"author": {"name": "bob"}}],
+            "labels": {"bug": "red", "feature": "red"}}
+
+    def test_equality(self):
+        self.assertTrue(filter_dict(self.data, "eventtype==push"))
+        self.assertTrue(filter_dict(self.data, "eventtype == push"))
+        self.assertFalse(filter_dict(self.data, "eventtype==ping"))
+        # values are compared as strings
+        self.assertTrue(filter_dict(self.data, "count==3"))
+
+    def test_negation(self):
+        self.assertTrue(filter_dict(self.data, "eventtype!=ping"))
+        self.assertFalse(filter_dict(self.data, "eventtype!=push"))
+        self.assertFalse(filter_dict(self.data, "eventtype!=ping|push"))
+
+    def test_membership(self):
+        self.assertTrue(filter_dict(self.data, "eventtype==ping|push"))
+        self.assertTrue(filter_dict(self.data, "eventtype==ping | push"))
+        self.assertFalse(filter_dict(self.data, "eventtype==ping|issues"))
+
+    def test_wildcard_pattern(self):
+        self.assertTrue(filter_dict(self.data, "ref==refs/heads/*"))
+        self.assertFalse(filter_dict(self.data, "ref==refs/tags/*"))
+
+    def test_nested_keys(self):
+        self.assertTrue(filter_dict(self.data,
+                                    "repository.owner.login==DefaultUser"))
+        self.assertTrue(filter_dict(self.data, "commits.1.author.name==bob"))
+        self.assertFalse(filter_dict(self.data, "commits.0.author.name==bob"))
+
+    def test_star_key(self):
+        # all list items or dict values have to match
+        self.assertTrue(filter_dict(self.data, "commits.*.author.name==b*"))
+        self.assertFalse(filter_dict(self.data, "commits.*.author.name==bot"))
+        self.assertTrue(filter_dict(self.data, "labels.*==red"))
+
+    def test_and(self):
+        self.assertTrue(filter_dict(self.data, "eventtype==push AND "
+                                    "repository.name==PyTIBot"))
+        self.assertFalse(filter_dict(self.data, "eventtype==push AND "
+                                     "repository.name==other"))
+
+    def test_invalid_rules(self):
+        self.assertFalse(filter_dict(self.data, "missing==push"))
+        self.assertFalse(filter_dict(self.data, "commits.5.author==bot"))
+        self.assertFalse(filter_dict(self.data, "no comparison"))
+        # rules are cached, make sure errors are not
+        self.assertFalse(filter_dict(self.data, "no comparison"))
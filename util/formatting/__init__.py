@@ -38,10 +38,10 @@ def from_human_readable(text: str) -> Tag:
 
 def colored(text: Message, fg: Union[ColorCodes, str],
             bg: Optional[Union[ColorCodes, str]] = None) -> Tag:
-    new_tag = tags.font(text, color=fg)
+    attributes = {"color": fg}
     if bg:
-        new_tag.attributes["background-color"] = bg
-    return new_tag
+        attributes["background-color"] = bg
+    return Tag("font", attributes=attributes, children=[text])
 
 
 def rainbow(text: Message) -> Tag:
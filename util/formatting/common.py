@@ -21,6 +21,7 @@ from colormath.color_conversions import convert_color
 from colormath.color_diff import delta_e_cie2000
 from dataclasses import dataclass, asdict
 from enum import Enum
+import functools
 import re
 from twisted.web.template import Tag, slot
 from typing import Union, Optional
@@ -227,10 +228,12 @@ HTMLColors = {
 }
 
 
+@functools.lru_cache(maxsize=256)
 def good_contrast_with_black(color: Union[str, ColorCodes]) -> bool:
     """
     Indicates if a color has good contrast with black. This is achieved by
-    looking at the `Value` in `HSV` color space
+    looking at the `Value` in `HSV` color space. Results are cached, as the
+    same (label) colors come up over and over again.
     """
     if isinstance(color, ColorCodes):
         color = ColorsHex[color]
@@ -455,7 +458,7 @@ def closest_colorcode(color: str) -> ColorCodes:
     \brief Find the closest color code
     \param color Color definition either as hex string or color name
     """
-    if color in [e.name for e in ColorCodes]:
+    if color in ColorCodes.__members__:
         return ColorCodes[color]
     if color in HTMLColors:
         color = HTMLColors[color]
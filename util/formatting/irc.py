@@ -226,19 +226,28 @@ class TagToIrcFormatter:
             style = self._style_stack[-1]
             if self._rainbow_content_length == 0:
                 return fragment
-            ret = ""
-            for char in fragment:
-                new_color = rainbow_color(
-                        self._rainbow_position/self._rainbow_content_length,
-                        common.RAINBOW_COLORS)
-                self._rainbow_position += 1
+            colors = common.RAINBOW_COLORS
+            num_colors = len(colors)
+            content_length = self._rainbow_content_length
+            start = self._rainbow_position
+            end = start + len(fragment)
+            self._rainbow_position = end
+            ret = []
+            pos = start
+            # emit every run of characters sharing a color as one slice
+            while pos < end:
+                index = pos * num_colors // content_length
+                # first position of the next color (ceil division)
+                segment_end = min(end, -(-(index + 1) * content_length // num_colors))
+                new_color = colors[index]
                 if new_color != style.fg:
-                    ret += _COLOR + new_color.value
+                    ret.append(_COLOR + new_color.value)
                     # set the color for all styles in the stack after the rainbow tag
                     for i in range(self._rainbow_tag_depth, len(self._style_stack)):
                         self._style_stack[i].fg = new_color
-                ret += char
-            return ret
+                ret.append(fragment[pos - start:segment_end - start])
+                pos = segment_end
+            return "".join(ret)
 
         fragments = data.split("\n")
         self.buffer += prepare_text_fragment(fragments[0])
@@ -301,12 +310,3 @@ def to_irc(data: Message) -> str:
             break
     return result
 
-
-def rainbow_color(factor: float, colors: list[ColorCodes]) -> ColorCodes:
-    """
-    \brief Return a color in the rainbow
-    \param factor        A value in [0,1]
-    \param colors        Color names to be featured in the rainbow
-    \returns The numerical value of the selected color
-    """
-    return colors[int(factor*len(colors))]
@@ -16,13 +16,30 @@
 
 from twisted.internet import defer
 from twisted.logger import Logger
-import treq
+from twisted.web.client import Agent, HTTPConnectionPool
+from treq.client import HTTPClient
 import zope.interface
 from dataclasses import dataclass
 
 
 log = Logger()
 
+_http_client = None
+
+
+def get_http_client():
+    """
+    Return the HTTP client that is shared by all outgoing requests so that
+    connections to the same host are kept alive and reused
+    """
+    global _http_client
+    if _http_client is None:
+        from twisted.internet import reactor
+        pool = HTTPConnectionPool(reactor, persistent=True)
+        pool.maxPersistentPerHost = 4
+        _http_client = HTTPClient(Agent(reactor, pool=pool))
+    return _http_client
+
 
 class _UrlShortenerPayloadAccessorInterface(zope.interface.Interface):
     def __call__(response):
@@ -79,9 +96,11 @@ def shorten_url(url, service_url, method, headers=None, post_data=None,
         # possible TODO: detect "Content-Type: application/json" header and switch
         # post_data to json
         # treq will set the "Content-Type" header based on content
-        response = yield treq.request(method, service_url, headers=headers,
-                                      data=post_data, params=request_params,
-                                      timeout=5)
+        response = yield get_http_client().request(method, service_url,
+                                                   headers=headers,
+                                                   data=post_data,
+                                                   params=request_params,
+                                                   timeout=5)
         if response.code < 200 or response.code >= 300:
             log.warn("Unexpected response code when shortening url {url}: {code}",
                      url=url, code=response.code)
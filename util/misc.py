@@ -16,7 +16,7 @@
 
 import re
 from fnmatch import fnmatch
-import itertools
+import functools
 import typing
 
 from twisted.logger import Logger
@@ -49,14 +49,26 @@ def annotation_to_str(annotation):
     return ""
 
 
+@functools.lru_cache(maxsize=256)
+def _parse_filter_rule(rule):
+    """
+    Splits a filter rule into (key_path, negate, patterns) per AND-ed
+    fragment. Rules come from the config, so each one is only parsed once.
+    """
+    fragments = []
+    for fragment in re.split(r"\s+AND\s+", rule):
+        key_path, cmp, val = re.split(r"\s*(==|!=)\s*", fragment, maxsplit=1)
+        fragments.append((tuple(key_path.split(".")), cmp == "!=",
+                          tuple(re.split(r"\s*\|\s*", val))))
+    return tuple(fragments)
+
+
 def filter_dict(data, rule):
     """
     Returns True if rule applies to the dictionary
     """
-    def _f(fragment, subdata):
-        key_path, cmp, val = re.split(r"\s*(==|!=)\s*", fragment, maxsplit=1)
+    def _f(key_path, negate, patterns, subdata):
         temp = subdata
-        key_path = key_path.split(".")
         for path_index, key_frag in enumerate(key_path):
             if key_frag == "*":
                 if isinstance(temp, list):
@@ -64,19 +76,20 @@ def filter_dict(data, rule):
                 else:
                     # otherwise it's a dict
                     star_replacements = temp.keys()
-                return all(_f(".".join([star, *key_path[path_index + 1:]]) + cmp + val, temp)
+                return all(_f((star, *key_path[path_index + 1:]), negate,
+                              patterns, temp)
                            for star in star_replacements)
             if isinstance(temp, list) and key_frag.isnumeric():
                 key_frag = int(key_frag)
             temp = temp[key_frag]
         # values from rules are always strings
         temp = str(temp)
-        if cmp == "!=":
-            return all(not fnmatch(temp, v) for v in re.split(r"\s*\|\s*", val))
-        return any(fnmatch(temp, v) for v in re.split(r"\s*\|\s*", val))
+        if negate:
+            return all(not fnmatch(temp, v) for v in patterns)
+        return any(fnmatch(temp, v) for v in patterns)
 
     try:
-        if all(map(_f, re.split(r"\s+AND\s+", rule), itertools.repeat(data))):
+        if all(_f(*fragment, data) for fragment in _parse_filter_rule(rule)):
             return True
     except Exception as e:
         logger.warn("Filter rule '{rule}' couldn't be applied: {e}",